@@ -1,6 +1,5 @@
 import time
 import streamlit as st
-from st_supabase_connection import SupabaseConnection, execute_query
 import pandas as pd
 import math
 import streamlit_antd_components as sac
@@ -11,16 +10,13 @@ st.set_page_config(
     page_icon="🏆",
 )
 
+from db import execute_query, products_table
 from utils import load_data
 
 # Initialize scroll states
 if 'scroll_to_top' not in st.session_state:
     st.session_state.scroll_to_top = False
 
-# Initialize connection and grab URL from secrets
-supabase = st.connection("supabase", type=SupabaseConnection)
-supabase_url = st.secrets["connections"]["supabase"]["SUPABASE_URL"]
-
 materials_dict = {
     'trophies': ['acrylic', 'wood', 'glass', 'metal'],
     'medals': ['acrylic', 'wood', 'metal']
@@ -45,8 +41,8 @@ if 'initialized' not in st.session_state:
 st.title("Trophy Monster Product Manager")
 
 if st.button("🔄 Refresh Data"):
-    st.cache_data.clear()
-    load_data(materials_dict)
+    # Only pulls rows changed since the last sync, other cached data is kept
+    load_data(materials_dict, sync=True)
 
 # Function to trigger scroll to top
 def trigger_scroll_to_top():
@@ -122,8 +118,12 @@ def display_order_table():
         st.write("Your order is empty.")
 
 # Search for products by name or code
-def search_products(df, search_query):
+def search_products(df, search_query, search_index=None):
     if search_query:
+        # Use the prebuilt index when it belongs to this DataFrame
+        if search_index is not None and search_index.size == len(df):
+            return df.iloc[search_index.search(search_query)]
+
         search_terms = search_query.lower().split()
         name_matches = pd.Series(True, index=df.index)
         code_matches = pd.Series(True, index=df.index)
@@ -142,12 +142,11 @@ def edit_product(model, origin, name, sport):
     category = singular_to_plural.get(origin[1].lower(),origin[1].lower())
     origin_table = f"{category}_{material}"
     if name:
-        execute_query(supabase.table(origin_table).update({"name": name}).eq("model", model))
+        execute_query(products_table(origin_table).update({"name": name}).eq("model", model))
     if sport:
-        execute_query(supabase.table(origin_table).update({"sport": sport}).eq("model", model))
-    st.cache_data.clear()
+        execute_query(products_table(origin_table).update({"sport": sport}).eq("model", model))
+    load_data(materials_dict, sync=True)
     st.rerun()
-    load_data(materials_dict)
 
 # Function to sort the DataFrame based on session state
 def sort_results(df):
@@ -249,7 +248,7 @@ def main():
         st.session_state['last_search'] = search_query
     
     if search_query:
-        result_df = search_products(final_df, search_query)
+        result_df = search_products(final_df, search_query, st.session_state.get('search_index'))
         
         if not result_df.empty:
             PAGE_SIZE = 25
@@ -275,26 +274,28 @@ def main():
             st.markdown("<hr style='margin-top: 0px; margin-bottom: 10px;'>", unsafe_allow_html=True)
 
             for idx, row in current_page_df.iterrows():
+                # Sizes are stored as Arrow lists in the shared catalog
+                sizes = list(row['sizes']) if pd.api.types.is_list_like(row['sizes']) else []
                 with st.container():
                     col1, col2, col3 = st.columns([3, 1, 1])
                     
                     with col1:
                         st.write(f"**Product Name**: {row['product name']}")
                         st.write(f"**Product Code**: {row['code']}") 
-                        if row['sizes']:
-                            sizes_display = ", ".join([f"{size}mm" for size in row['sizes']])
+                        if sizes:
+                            sizes_display = ", ".join([f"{size}mm" for size in sizes])
                             st.write(f"**Available Sizes**: {sizes_display}")
                         else:
                             st.write("No sizes found for this product.")
                     
                     with col2:
                         with st.popover(f"Add to Order"):
-                            if row['sizes']:
+                            if sizes:
                                 # Using a form to group inputs so that intermediate changes do not trigger re-runs
                                 with st.form(key=f"order_form_{row['code']}_{idx}"):
                                     size_selected = st.selectbox(
                                         f"Select Size for {row['product name']}",
-                                        options=[f"{size}mm" for size in row['sizes']],
+                                        options=[f"{size}mm" for size in sizes],
                                         key=f"size_{row['code']}_{idx}"
                                     )
 
@@ -317,7 +318,7 @@ def main():
                                         ranges_to_append_sport = ['ACLA2101', 'MDAB', 'MDAA10']
 
                                         if row['range'] in ranges_to_append_sport:
-                                            if row['sport']:
+                                            if pd.notna(row['sport']) and row['sport']:
                                                 if notes.strip():
                                                     notes += f", {row['sport']}"
                                                 else:
@@ -337,10 +338,10 @@ def main():
                             name = st.text_input("Enter a new model name", key=f"namechange_{row['product name']}_{idx}")
                             sport = st.text_input("Enter a new sport/category", key=f"sportchange_{row['product name']}_{idx}")
                             if st.button("Confirm", key=f"confirmedit_{row['product name']}_{idx}"):
-                                origin = row['product name'].split()[-2:] if row['product name'] else []
+                                origin = row['product name'].split()[-2:] if pd.notna(row['product name']) else []
                                 edit_product(row['code'], origin, name, sport)
                     
-                    st.image(row['image url'], width=175)
+                    st.image(row['thumbnail url'], width=175)
                     st.write('---')
 
             _, top, _ = st.columns([1.2,1,1])
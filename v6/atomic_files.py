@@ -0,0 +1,50 @@
+# atomic_files.py
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+# Bytes copied at a time by copy_atomic
+COPY_CHUNK_SIZE = 64 * 1024
+
+@contextmanager
+def replacing(path):
+    # Binary file to write path's new contents to. It is a temp file next to
+    # path, renamed over it once the block completes and removed if it
+    # doesn't, so readers only ever see the old file or the whole new one.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def write_atomic(path, data):
+    with replacing(path) as f:
+        f.write(data)
+
+def copy_atomic(source_path, path):
+    with replacing(path) as f, open(source_path, "rb") as source:
+        shutil.copyfileobj(source, f, COPY_CHUNK_SIZE)
+
+def link_atomic(source_path, path):
+    # Hard links source_path at path, so the two share one copy on disk.
+    # Only safe for files that are replaced by renames, never written in
+    # place. Copies where links aren't possible.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    os.remove(tmp_path)
+    try:
+        os.link(source_path, tmp_path)
+    except OSError:
+        copy_atomic(source_path, path)
+        return
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
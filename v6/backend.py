@@ -1,16 +1,31 @@
 import os
-import io
+import collections
+import time
 import streamlit as st
 import mimetypes
-from st_supabase_connection import SupabaseConnection, execute_query
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from db import execute_query, products_table, sizes_table, product_sizes, rpc, bucket
+from images import make_variants, variant_keys, THUMB_PREFIX
+from scrape_jobs import file_sha256
+from upload_manifest import UploadManifest
 
-# Initialize Supabase connection
-supabase = st.connection("supabase", type=SupabaseConnection)
-supabase_url = st.secrets["connections"]["supabase"]["SUPABASE_URL"]
+# Rows per insert request for bulk inserts
+INSERT_BATCH_SIZE = 500
 
-class UploadFile(io.BytesIO):
-    """A subclass of BytesIO to allow setting extra attributes."""
-    pass
+# Image uploads allowed in flight at once
+UPLOAD_WORKERS = 8
+
+# Attempts per image upload, waiting UPLOAD_BACKOFF seconds after the first
+# failure and doubling the wait after each one that follows
+UPLOAD_ATTEMPTS = 4
+UPLOAD_BACKOFF = 0.5
+
+# Images resized and encoded at once; Pillow releases the GIL while doing
+# it, so these threads run in parallel with each other and the uploads
+IMAGE_WORKERS = 4
+
+# Entries per storage list request
+LIST_PAGE_SIZE = 1000
 
 def insert_products_to_supabase(products):
     grouped = {}
@@ -26,28 +41,206 @@ def insert_products_to_supabase(products):
             "type": product["formatted_type"]
         })
     for table_name, data_list in grouped.items():
-        _ = execute_query(supabase.table(table_name).insert(data_list), ttl=0)
+        _ = execute_query(products_table(table_name).insert(data_list))
+
+def upload_file(bucket_name, path, local_path, content_type):
+    # Streams the file from disk rather than reading it into memory first
+    with open(local_path, "rb") as f:
+        return bucket(bucket_name).upload(
+            path=path,
+            file=f,
+            file_options={"content-type": content_type, "upsert": "true"}
+        )
+
+def upload_bytes(bucket_name, path, data, content_type):
+    return bucket(bucket_name).upload(
+        path=path,
+        file=data,
+        file_options={"content-type": content_type, "upsert": "true"}
+    )
+
+def with_retries(func, *args):
+    for attempt in range(UPLOAD_ATTEMPTS):
+        try:
+            return func(*args)
+        except Exception:
+            if attempt == UPLOAD_ATTEMPTS - 1:
+                raise
+            time.sleep(UPLOAD_BACKOFF * 2 ** attempt)
 
-def upload_images_to_supabase(products):
+def upload_variants(bucket_name, variants):
+    for key, data in variants.items():
+        with_retries(upload_bytes, bucket_name, key, data, "image/webp")
+
+def upload_product_image(product, variants_future=None):
+    # Uploads the original while its variants are still being made, then
+    # the variants once they are ready
+    bucket_name = product["raw_type"]
+    file_name = os.path.basename(product["temp_image_path"])
+    mime_type, _ = mimetypes.guess_type(file_name)
+    if mime_type is None:
+        mime_type = "application/octet-stream"
+    result = with_retries(upload_file, bucket_name, file_name, product["temp_image_path"], mime_type)
+    if variants_future is not None:
+        upload_variants(bucket_name, variants_future.result())
+    return result
+
+def copy_stored_image(bucket_name, source, target):
+    # Server-side copy of an image and its variants to another name. Copies
+    # don't overwrite, so whatever is at the target is removed first; if a
+    # copy then fails the caller uploads the image instead.
+    pairs = [(source, target)]
+    source_keys, target_keys = variant_keys(source), variant_keys(target)
+    pairs += [(source_keys[kind], target_keys[kind]) for kind in source_keys]
+    with_retries(bucket(bucket_name).remove, [to_path for _, to_path in pairs])
+    for from_path, to_path in pairs:
+        with_retries(bucket(bucket_name).copy, from_path, to_path)
+
+def upload_image_group(bucket_name, digest, products, manifest, image_executor, dedupe, batch_paths):
+    # Stores the images of products that share the same bytes: nothing is
+    # sent for a path that already holds them, a copy is made server-side
+    # when another path does, and otherwise the image is uploaded with its
+    # variants. Paths written by other groups of the batch (batch_paths) are
+    # never copied from, as they may already hold their new bytes. Returns
+    # (product, error) pairs.
+    results = []
+    source = None
+    if dedupe:
+        file_names = [os.path.basename(product["temp_image_path"]) for product in products]
+        unchanged = [name for name in file_names if manifest.unchanged(name, digest)]
+        source = unchanged[0] if unchanged else manifest.stored_copy(digest, exclude=batch_paths)
     for product in products:
-        bucket_name = product["raw_type"]
-        if product["temp_image_path"] and os.path.exists(product["temp_image_path"]):
-            file_name = os.path.basename(product["temp_image_path"])
-            with open(product["temp_image_path"], "rb") as f:
-                file_bytes = f.read()
-            mime_type, _ = mimetypes.guess_type(file_name)
-            if mime_type is None:
-                mime_type = "application/octet-stream"
-            file_buffer = UploadFile(file_bytes)
-            file_buffer.name = file_name
-            file_buffer.type = mime_type
-            _ = supabase.upload(
-                bucket_name,
-                source='local',
-                file=file_buffer,
-                destination_path=file_name,
-                overwrite='true'
-            )
+        path = product["temp_image_path"]
+        file_name = os.path.basename(path)
+        try:
+            if manifest.unchanged(file_name, digest):
+                pass
+            else:
+                copied = False
+                if source is not None and source != file_name:
+                    try:
+                        copy_stored_image(bucket_name, source, file_name)
+                        copied = True
+                    except Exception as e:
+                        print(f"Copy of '{source}' to '{file_name}' failed, uploading instead: {e}")
+                if not copied:
+                    variants_future = image_executor.submit(make_variants, path, file_name)
+                    upload_product_image(product, variants_future)
+                    if dedupe:
+                        source = file_name
+            manifest.record(file_name, digest)
+            results.append((product, None))
+        except Exception as e:
+            results.append((product, e))
+    return results
+
+def upload_images_to_supabase(products, on_progress=None, dedupe=True):
+    # Uploads the products' temp images through a bounded worker pool, so one
+    # slow or failing file doesn't hold up the rest. A separate pool makes the
+    # thumbnail and WebP variants of each image (see images.py) alongside.
+    # Images are identified by their sha256: ones already uploaded unchanged
+    # are skipped, and with dedupe, identical images under another model's
+    # name are copied server-side instead of sent again.
+    # on_progress(done, total, product, error) is called on the calling
+    # thread as each one finishes. Returns (product, error) pairs for the
+    # images that failed every attempt.
+    pending = [
+        product for product in products
+        if product["temp_image_path"] and os.path.exists(product["temp_image_path"])
+    ]
+    manifests = {name: UploadManifest(name) for name in {product["raw_type"] for product in pending}}
+    errors = []
+    done = 0
+    try:
+        with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor, \
+                ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as image_executor:
+            digests = list(image_executor.map(file_sha256, [product["temp_image_path"] for product in pending]))
+            groups = {}
+            for index, (product, digest) in enumerate(zip(pending, digests)):
+                key = (product["raw_type"], digest) if dedupe else (product["raw_type"], digest, index)
+                groups.setdefault(key, []).append(product)
+
+            batch_paths = {}
+            for product in pending:
+                batch_paths.setdefault(product["raw_type"], set()).add(os.path.basename(product["temp_image_path"]))
+
+            futures = [
+                executor.submit(
+                    upload_image_group, key[0], key[1], group, manifests[key[0]], image_executor, dedupe,
+                    batch_paths[key[0]]
+                )
+                for key, group in groups.items()
+            ]
+            for future in as_completed(futures):
+                for product, error in future.result():
+                    done += 1
+                    if error:
+                        st.error(f"Error uploading image for model '{product['model']}': {error}")
+                        errors.append((product, error))
+                    if on_progress:
+                        on_progress(done, len(pending), product, error)
+    finally:
+        for manifest in manifests.values():
+            manifest.save()
+    return errors
+
+def list_bucket_files(bucket_name, folder=""):
+    # Names of the files directly inside folder, one page at a time
+    names = []
+    offset = 0
+    while True:
+        entries = bucket(bucket_name).list(folder, {"limit": LIST_PAGE_SIZE, "offset": offset})
+        # Sub-folders are listed too, without an id
+        names.extend(entry["name"] for entry in entries if entry.get("id"))
+        if len(entries) < LIST_PAGE_SIZE:
+            return names
+        offset += LIST_PAGE_SIZE
+
+def backfill_variants_for(bucket_name, file_name):
+    data = bucket(bucket_name).download(file_name)
+    upload_variants(bucket_name, make_variants(data, file_name))
+
+def backfill_image_variants(bucket_name, on_progress=None):
+    # Makes the thumbnail and WebP variants for images in a bucket uploaded
+    # before variants existed. on_progress(done, total, file_name, error) is
+    # called as each one finishes. Returns (file_name, error) pairs.
+    originals = [
+        name for name in list_bucket_files(bucket_name)
+        if (mimetypes.guess_type(name)[0] or "").startswith("image/")
+    ]
+    thumbs = set(list_bucket_files(bucket_name, THUMB_PREFIX.rstrip("/")))
+    missing = [
+        name for name in originals
+        if variant_keys(name)["thumb"][len(THUMB_PREFIX):] not in thumbs
+    ]
+    errors = []
+    with ThreadPoolExecutor(max_workers=IMAGE_WORKERS) as executor:
+        futures = {executor.submit(backfill_variants_for, bucket_name, name): name for name in missing}
+        for done, future in enumerate(as_completed(futures), start=1):
+            name = futures[future]
+            error = future.exception()
+            if error:
+                errors.append((name, error))
+            if on_progress:
+                on_progress(done, len(missing), name, error)
+    return errors
+
+def insert_rows(get_table, rows):
+    # Inserts rows in batches of INSERT_BATCH_SIZE, one request per batch.
+    # PostgREST rejects a batch as a whole, so a failed batch is retried row
+    # by row to find the rows at fault. Returns (row, error) pairs.
+    errors = []
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        batch = rows[start:start + INSERT_BATCH_SIZE]
+        try:
+            _ = execute_query(get_table().insert(batch))
+        except Exception:
+            for row in batch:
+                try:
+                    _ = execute_query(get_table().insert(row))
+                except Exception as e:
+                    errors.append((row, e))
+    return errors
 
 def insert_sizes_and_update_sizes_table(products, sizes):
     grouped = {}
@@ -56,49 +249,89 @@ def insert_sizes_and_update_sizes_table(products, sizes):
         if product_type not in grouped:
             grouped[product_type] = []
         grouped[product_type].append(product)
-    
+
+    # One product_sizes row per product type, all in a single request
+    product_sizes_rows = [
+        {"product_code": product_list[0]["product_code"], "sizes": sizes}
+        for product_list in grouped.values()
+    ]
+    errors = []
+    for row, e in insert_rows(product_sizes, product_sizes_rows):
+        st.error(f"Error inserting into 'product_sizes' for product code '{row['product_code']}': {e}")
+        errors.append(("product_sizes", row, e))
+
+    # Every size row of a type is built up front and sent in large batches
+    # rather than one request per model and size
     for product_type, product_list in grouped.items():
-        product_code = product_list[0]["product_code"]
-        _ = execute_query(supabase.table("product_sizes").insert({"product_code": product_code, "sizes": sizes}), ttl=0)
-        sizes_table = f"{product_type}_sizes"
+        rows = []
         for product in product_list:
             model = product["model"]
             for idx, size in enumerate(sizes):
                 size_code_suffix = chr(65 + idx)
                 size_code = model + size_code_suffix
-                row_data = {"model": model, "size_code": size_code, "size": size}
-                try:
-                    _ = execute_query(supabase.table(sizes_table).insert(row_data), ttl=0)
-                except Exception as e:
-                    st.error(f"Error inserting into '{sizes_table}' for model '{model}': {e}")
+                rows.append({"model": model, "size_code": size_code, "size": size})
 
-def update_ribbon_stock(summary_df):
-    updates_made = []
+        for row, e in insert_rows(lambda: sizes_table(product_type), rows):
+            st.error(f"Error inserting into '{product_type}_sizes' for model '{row['model']}': {e}")
+            errors.append((f"{product_type}_sizes", row, e))
+    return errors
 
-    for _, row in summary_df.iterrows():
-        colour = row["colour"]
-        ordered_qty = int(row["quantity"])
+def apply_ribbon_documents(documents):
+    # Takes the items of each (digest, name, items) PDF off the stock through
+    # the ribbon stock ledger (sql/ribbon_stock_ledger.sql), in one call.
+    # PDFs whose digest is already in the ledger are skipped whole, and so
+    # are orders whose colour an earlier PDF already took off. Returns the
+    # (colour, before, subtracted, after) updates, before and after being
+    # None for unknown colours, the names of the skipped PDFs and the
+    # (name, order ID, colour) of the skipped orders.
+    movements = {}
+    for digest, name, items in documents:
+        totals = collections.Counter()
+        for item in items:
+            totals[(item.get("order_id", ""), item["ribbon_colour"])] += int(item["final_qty"])
+        movements.setdefault(digest, (name, totals))
+    if not movements:
+        return [], [], []
 
-        # 1) Fetch current quantity
-        response = execute_query(
-            supabase.table("ribbons").select("quantity").eq("colour", colour),
-            ttl=0
-        )
-
-        if response.data:
-            current_qty = response.data[0]["quantity"]
-            new_qty = max(current_qty - ordered_qty, 0)
+    response = execute_query(
+        rpc("apply_ribbon_documents", {
+            "documents": [
+                {
+                    "document_hash": digest,
+                    "name": name,
+                    "movements": [
+                        {"order_id": order_id, "colour": colour, "delta": -qty}
+                        for (order_id, colour), qty in totals.items()
+                    ],
+                }
+                for digest, (name, totals) in movements.items()
+            ]
+        })
+    )
+    result = response.data or {}
+    duplicates = set(result.get("duplicates") or [])
+    applied_orders = {
+        (row["document_hash"], row["order_id"], row["colour"]) for row in result.get("applied_orders") or []
+    }
+    stock = {row["colour"]: row for row in result.get("stock") or []}
 
-            # 2) Update the stock
-            _ = execute_query(
-                supabase.table("ribbons")
-                .update({"quantity": new_qty})
-                .eq("colour", colour),
-                ttl=0
-            )
+    subtracted = collections.Counter()
+    for digest, (name, totals) in movements.items():
+        if digest not in duplicates:
+            for (order_id, colour), qty in totals.items():
+                if (digest, order_id, colour) not in applied_orders:
+                    subtracted[colour] += qty
 
-            updates_made.append((colour, current_qty, ordered_qty, new_qty))
+    updates_made = []
+    for colour, ordered_qty in subtracted.items():
+        row = stock.get(colour)
+        if row:
+            updates_made.append((colour, row["before_quantity"], ordered_qty, row["after_quantity"]))
         else:
             updates_made.append((colour, None, ordered_qty, None))
 
-    return updates_made
+    skipped = [name for digest, (name, _) in movements.items() if digest in duplicates]
+    skipped_orders = sorted(
+        (movements[digest][0], order_id, colour) for digest, order_id, colour in applied_orders
+    )
+    return updates_made, skipped, skipped_orders
@@ -0,0 +1,241 @@
+# benchmarks/bench_amazon_parse.py
+#
+# Compares the single-pass Amazon packing slip parser against the one the
+# Ribbon Tracker used before, on synthetic slips shaped like pdfminer's HTML
+# output. Checks both find exactly the same items on a batch of small random
+# slips, then times both on large ones, with and without order IDs on most
+# slips.
+#
+#   python benchmarks/bench_amazon_parse.py --orders 300 --checks 200
+
+import os
+import sys
+import time
+import random
+import argparse
+from html import escape
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ribbon_parsing import (
+    ORDER_ID_RE,
+    PACK_QTY_RE,
+    is_integer,
+    is_price,
+    normalise_colour,
+)
+from html_route import clean_html, parse_amazon_orders
+
+COLOURS = ["Red", "Royal Blue", "Red/White/Blue", "Black and Gold", "Green", "SkyBlue", "Purple", "Navy/White"]
+CONTINUATIONS = ["and Yellow", "Stripe", "VAT 20%", "Page 2 of 3", "2", "Total: £3.00", "Silver Glitter Extra Long Ribbon Version"]
+PRODUCTS = ["Clip On Medal Ribbons", "Medal Ribbon Clip On Style", "Acrylic Trophy", "Gold Medal 50mm"]
+
+def legacy_parse_amazon_orders(soup):
+    orders_items = []
+    all_divs = soup.find_all("div")
+    total_divs = len(all_divs)
+    idx = 0
+
+    while idx < total_divs:
+        div = all_divs[idx]
+        if "Dispatch to:" in div.get_text():
+            order_id = "UNKNOWN"
+            for i in range(idx, min(idx + 50, total_divs)):
+                text = all_divs[i].get_text()
+                match = ORDER_ID_RE.search(text)
+                if match:
+                    order_id = match.group()
+                    break
+
+            quantity_idx = None
+            for i in range(idx, min(idx + 200, total_divs)):
+                if "Quantity  Product Details" in all_divs[i].get_text():
+                    quantity_idx = i
+                    break
+
+            if quantity_idx:
+                content_divs = []
+                for i in range(quantity_idx + 1, total_divs):
+                    t = all_divs[i].get_text().strip()
+                    if t:
+                        if ORDER_ID_RE.search(t):
+                            break
+                        content_divs.append(t)
+
+                has_ribbons = any(
+                    "Type your clip-on ribbon colour choice here" in t
+                    for t in content_divs
+                )
+                if not has_ribbons:
+                    idx += 1
+                    continue
+
+                i = 0
+                while i + 2 < len(content_divs):
+                    qty_text = content_divs[i]
+                    desc = content_divs[i+1]
+                    price = content_divs[i+2]
+
+                    if is_integer(qty_text) and desc and is_price(price):
+                        base_qty = int(qty_text)
+                        is_pack = "Pack of" in desc
+                        pack_size = None
+                        final_qty = base_qty
+
+                        if is_pack:
+                            j = i + 3
+                            while j < len(content_divs):
+                                if j + 2 < len(content_divs):
+                                    maybe_qty = content_divs[j]
+                                    maybe_desc = content_divs[j+1]
+                                    maybe_price = content_divs[j+2]
+                                    if is_integer(maybe_qty) and maybe_desc and is_price(maybe_price):
+                                        break
+                                if ORDER_ID_RE.search(content_divs[j]):
+                                    break
+                                if "::" in content_divs[j] and "x" in content_divs[j]:
+                                    m = PACK_QTY_RE.search(content_divs[j])
+                                    if m:
+                                        pack_size = int(m.group(1))
+                                        final_qty = base_qty * pack_size
+                                j += 1
+
+                        ribbon_colour = ""
+                        j = i + 3
+                        while j < len(content_divs):
+                            if j + 2 < len(content_divs):
+                                maybe_qty = content_divs[j]
+                                maybe_desc = content_divs[j+1]
+                                maybe_price = content_divs[j+2]
+                                if is_integer(maybe_qty) and maybe_desc and is_price(maybe_price):
+                                    break
+                            if ORDER_ID_RE.search(content_divs[j]):
+                                break
+
+                            if "Type your clip-on ribbon colour choice here" in content_divs[j]:
+                                line = content_divs[j]
+                                if "::" in line:
+                                    colour_part = line.split("::", 1)[1].strip()
+                                elif ":" in line:
+                                    colour_part = line.split(":", 1)[1].strip()
+                                else:
+                                    colour_part = line.strip()
+
+                                next_line = ""
+                                if j + 1 < len(content_divs):
+                                    next_line = content_divs[j+1].strip()
+                                    next_line_words = len(next_line.split())
+                                    is_just_int = False
+                                    try:
+                                        int(next_line)
+                                        is_just_int = True
+                                    except:
+                                        pass
+
+                                    if (
+                                        next_line_words <= 5 and
+                                        "VAT" not in next_line.upper() and
+                                        "PAGE" not in next_line.upper() and
+                                        "TOTAL" not in next_line.upper() and
+                                        ":" not in next_line and
+                                        not is_just_int and
+                                        next_line
+                                    ):
+                                        colour_part += " " + next_line
+
+                                ribbon_colour = normalise_colour(colour_part)
+                                break
+
+                            j += 1
+
+                        orders_items.append({
+                            "ribbon_colour": ribbon_colour,
+                            "final_qty": final_qty
+                        })
+
+                        i += 3
+                    else:
+                        i += 1
+        idx += 1
+
+    return orders_items
+
+def without_order_ids(items):
+    # The old parser found each slip's order ID but didn't keep it
+    return [{"ribbon_colour": item["ribbon_colour"], "final_qty": item["final_qty"]} for item in items]
+
+def order_id(rng):
+    return f"{rng.randint(200, 299)}-{rng.randint(1000000, 9999999)}-{rng.randint(1000000, 9999999)}"
+
+def slip_blocks(rng, number, pages, with_order_id=True):
+    # Text blocks of one packing slip page
+    blocks = [f"Page {number} of {pages}"]
+    blocks.append(rng.choice(["Dispatch to:", "Dispatch to:\nJane Doe"]))
+    blocks += ["Jane Doe", f"{rng.randint(1, 200)} High Street", "Leeds", "LS1 1AA"]
+    if with_order_id:
+        blocks.append(f"Order ID: {order_id(rng)}")
+    blocks.append("Thank you for buying from Trophies on Amazon Marketplace.")
+    if rng.random() < 0.2:
+        # Some slips repeat the address block
+        blocks += ["Dispatch to:", "Jane Doe"]
+    blocks.append("   ")
+    blocks.append("Quantity  Product Details  Unit price  Order Totals")
+    ribbons = rng.random() < 0.8
+    for _ in range(rng.randint(1, 5)):
+        is_pack = rng.random() < 0.5
+        product = rng.choice(PRODUCTS) + (f" Pack of {rng.choice([5, 10, 20])}" if is_pack else "")
+        blocks += [str(rng.randint(1, 4)), product, f"£{rng.randint(1, 30)}.{rng.randint(0, 99):02d}"]
+        blocks += [f"SKU: RIB-{rng.randint(100, 999)}", f"ASIN: B0{rng.randint(10000000, 99999999)}", "Condition: New"]
+        if is_pack and rng.random() < 0.8:
+            blocks.append(f"Pack Size:: {rng.choice([5, 10, 20])}x Ribbons")
+        if ribbons and rng.random() < 0.9:
+            separator = rng.choice(["::", ":", " "])
+            blocks.append(f"Type your clip-on ribbon colour choice here{separator} {rng.choice(COLOURS)}")
+            if rng.random() < 0.5:
+                blocks.append(rng.choice(CONTINUATIONS))
+        if rng.random() < 0.3:
+            blocks.append("")
+    blocks += [f"Item subtotal £{rng.randint(5, 90)}.00", "Shipping total £0.00", f"VAT £{rng.randint(1, 9)}.00"]
+    return blocks
+
+def slip_html(rng, orders, order_id_rate=1.0):
+    # pdfminer-style HTML: one absolutely positioned div per text box.
+    # Slips without an order ID make each order's product table run on into
+    # the following slips, as with IDs pdfminer didn't pick up.
+    divs = []
+    for number in range(1, orders + 1):
+        for top, block in enumerate(slip_blocks(rng, number, orders, rng.random() < order_id_rate)):
+            lines = "<br>".join(escape(line) for line in block.split("\n"))
+            divs.append(
+                f'<div style="position:absolute; left:40px; top:{number * 1000 + top * 12}px;">'
+                f'<span style="font-family: Helvetica; font-size:9px">{lines}\n<br></span></div>'
+            )
+        divs.append('<span style="position:absolute; border: gray 1px solid;"></span>')
+    return "<html><body>" + "".join(divs) + "</body></html>"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=300, help="pages in the large slip")
+    parser.add_argument("--checks", type=int, default=200, help="random slips to compare the parsers on")
+    args = parser.parse_args()
+
+    for seed in range(args.checks):
+        rng = random.Random(seed)
+        soup = clean_html(slip_html(rng, rng.randint(1, 8), rng.choice([1.0, 0.5, 0.0])))
+        expected = legacy_parse_amazon_orders(soup)
+        assert without_order_ids(parse_amazon_orders(soup)) == expected, f"parsers disagree on slip {seed}"
+    print(f"identical items on {args.checks} random slips")
+
+    for label, order_id_rate in (("order IDs on every slip", 1.0), ("order IDs on a tenth of slips", 0.1)):
+        soup = clean_html(slip_html(random.Random(args.checks), args.orders, order_id_rate))
+        start = time.perf_counter()
+        expected = legacy_parse_amazon_orders(soup)
+        legacy_time = time.perf_counter() - start
+        start = time.perf_counter()
+        items = parse_amazon_orders(soup)
+        new_time = time.perf_counter() - start
+        assert without_order_ids(items) == expected
+        print(f"{args.orders}-page slip, {label} ({len(soup.find_all('div'))} blocks, {len(items)} items): "
+              f"{legacy_time * 1000:.0f}ms -> {new_time * 1000:.0f}ms ({legacy_time / new_time:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_parse.py
+#
+# Times parsing the listing and product page fixtures the way the scraper
+# used to (whole page through html.parser) against the targeted parse with
+# each available backend, and checks they extract the same data. The
+# fixtures are synthetic, not saved Bauer pages: the elements the scraper
+# reads, padded with generated markup (CSS rules, filter and category
+# lists) to about the size of a real page. Timings on them show the
+# difference between the parses, not what the live pages will see.
+#
+#   python benchmarks/bench_parse.py --repeat 50
+
+import os
+import sys
+import time
+import argparse
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scraping
+from scraping import extract_model_sport
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def legacy_listing(content):
+    page_soup = BeautifulSoup(content, 'html.parser')
+    product_divs = page_soup.find_all('div', class_="swiper-slide cell cell--product")
+    if not product_divs:
+        return None
+    entries = []
+    for prod_div in product_divs:
+        h3_tag = prod_div.find('h3', class_="listing-item__headline")
+        a_tag = prod_div.find('a', class_="listing-item__image")
+        if h3_tag and h3_tag.a and a_tag:
+            model, sport = extract_model_sport(h3_tag.a.get_text(strip=True))
+            entries.append((model, sport, a_tag.get('href')))
+    return entries
+
+def legacy_gallery_link(content):
+    soup = BeautifulSoup(content, 'html.parser')
+    img_tag = soup.find('a', class_='product-gallery__link nounderline')
+    if img_tag and img_tag.get('href'):
+        return img_tag['href']
+    return None
+
+def available_parsers():
+    parsers = ['html.parser']
+    try:
+        import lxml  # noqa: F401
+        parsers.append('lxml')
+    except ImportError:
+        print("lxml not installed, only html.parser is timed")
+    return parsers
+
+def time_per_call(func, content, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(content)
+    return (time.perf_counter() - start) / repeat, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    pages = {}
+    for name in ("listing", "product"):
+        with open(os.path.join(FIXTURES, f"{name}.html"), "rb") as f:
+            pages[name] = f.read()
+
+    cases = {
+        "listing": (legacy_listing, scraping.parse_listing),
+        "product": (legacy_gallery_link, scraping.parse_gallery_link),
+    }
+    for name, (legacy, targeted) in cases.items():
+        content = pages[name]
+        legacy_time, expected = time_per_call(legacy, content, args.repeat)
+        print(f"{name} page ({len(content) / 1024:.0f} KB)")
+        print(f"  full parse, html.parser     {legacy_time * 1000:7.2f} ms")
+        for backend in available_parsers():
+            scraping.HTML_PARSER = backend
+            elapsed, result = time_per_call(targeted, content, args.repeat)
+            assert result == expected, f"{backend} extracted different data from the {name} page"
+            print(f"  targeted parse, {backend:<11} {elapsed * 1000:7.2f} ms  ({legacy_time / elapsed:.1f}x)")
+
+if __name__ == "__main__":
+    main()
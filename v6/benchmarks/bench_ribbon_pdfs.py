@@ -0,0 +1,166 @@
+# benchmarks/bench_ribbon_pdfs.py
+#
+# Times the Ribbon Tracker's PDF ingestion on a batch of synthetic Amazon
+# packing slip and supplier invoice PDFs. Compares text extraction through
+# pdfminer's HTML output and BeautifulSoup with pdf_text_blocks (same
+# blocks, time and peak memory), then parsing one after another with
+# parse_pdfs' process pool, checking both find the same items per file.
+#
+#   python benchmarks/bench_ribbon_pdfs.py --files 12 --pages 40
+#   python benchmarks/bench_ribbon_pdfs.py --write-dir /tmp/slips
+
+import os
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ribbon_parsing import PDF_WORKERS, parse_pdf, parse_pdfs, pdf_text_blocks
+from bench_amazon_parse import COLOURS, slip_blocks
+from html_route import clean_html, div_blocks, pdf_to_html
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+FONT_SIZE = 9
+# Baseline to baseline within a block, and between blocks (far enough apart
+# for pdfminer to keep them as separate text boxes)
+LINE_STEP = 11
+BLOCK_STEP = 18
+
+def pdf_string(text):
+    text = text.encode("cp1252", "replace").decode("latin-1")
+    return "(" + text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+def page_streams(blocks):
+    # Text blocks down the page, running on to another page when one is full
+    pages = []
+    ops = []
+    y = PAGE_HEIGHT - 40
+    for block in blocks:
+        lines = block.split("\n") if block.strip() else []
+        if not lines:
+            continue
+        if y - BLOCK_STEP - LINE_STEP * len(lines) < 40:
+            pages.append(ops)
+            ops = []
+            y = PAGE_HEIGHT - 40
+        for line in lines:
+            ops.append(f"BT /F1 {FONT_SIZE} Tf 40 {y} Td {pdf_string(line)} Tj ET")
+            y -= LINE_STEP
+        y -= BLOCK_STEP - LINE_STEP
+    pages.append(ops)
+    return ["\n".join(page).encode("latin-1") for page in pages]
+
+def make_pdf(documents):
+    # Minimal PDF with one Helvetica text object per line, each list of
+    # text blocks in documents starting on a new page
+    streams = [stream for blocks in documents for stream in page_streams(blocks)]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for stream in streams:
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << /Font << /F1 3 0 R >> >> "
+            b"/Contents %d 0 R >>" % (PAGE_WIDTH, PAGE_HEIGHT, len(objects))
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % kid for kid in kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+def amazon_pdf(rng, pages):
+    return make_pdf([slip_blocks(rng, number, pages) for number in range(1, pages + 1)])
+
+def supplier_pdf(rng, lines):
+    blocks = ["Invoice", f"No. {rng.randint(10000, 99999)}"]
+    for _ in range(lines):
+        blocks += [f"{rng.choice(COLOURS)} Clip on Medal Ribbon", f"{rng.choice([50, 100, 200])} ks"]
+    return make_pdf([blocks])
+
+def batch(seed, files, pages):
+    rng = random.Random(seed)
+    result = []
+    for number in range(files):
+        if number % 4 == 3:
+            result.append((f"supplier_{number}.pdf", supplier_pdf(rng, pages * 3)))
+        else:
+            result.append((f"amazon_{number}.pdf", amazon_pdf(rng, pages)))
+    return result
+
+def html_blocks(data):
+    # Text blocks the way the Ribbon Tracker got them before pdf_text_blocks
+    return div_blocks(clean_html(pdf_to_html(BytesIO(data))))
+
+def measure(extract, files):
+    # Blocks per file, seconds and peak traced memory for the largest file
+    start = time.perf_counter()
+    blocks = {name: extract(data) for name, data in files}
+    elapsed = time.perf_counter() - start
+    largest = max(files, key=lambda file: len(file[1]))[1]
+    tracemalloc.start()
+    extract(largest)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return blocks, elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=12, help="PDFs in the batch")
+    parser.add_argument("--pages", type=int, default=40, help="slips per Amazon PDF")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--write-dir", help="also save the PDFs here")
+    args = parser.parse_args()
+
+    files = batch(args.seed, args.files, args.pages)
+    if args.write_dir:
+        os.makedirs(args.write_dir, exist_ok=True)
+        for name, data in files:
+            with open(os.path.join(args.write_dir, name), "wb") as f:
+                f.write(data)
+    size = sum(len(data) for _, data in files)
+    print(f"{len(files)} PDFs, {size / 1024:.0f} KB, {PDF_WORKERS} workers")
+
+    expected_blocks, html_time, html_peak = measure(html_blocks, files)
+    blocks, direct_time, direct_peak = measure(lambda data: list(pdf_text_blocks(BytesIO(data))), files)
+    assert blocks == expected_blocks, "pdf_text_blocks differs from the HTML route"
+    print(f"text blocks via HTML {html_time:.2f}s (peak {html_peak / 1024 / 1024:.1f} MB), "
+          f"direct {direct_time:.2f}s (peak {direct_peak / 1024 / 1024:.1f} MB), "
+          f"{html_time / direct_time:.1f}x faster")
+
+    start = time.perf_counter()
+    expected = {name: parse_pdf(data) for name, data in files}
+    serial_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    first = None
+    results = {}
+    for name, detected_type, items in parse_pdfs(files):
+        if first is None:
+            first = time.perf_counter() - start
+        results[name] = (detected_type, items)
+    pool_time = time.perf_counter() - start
+
+    assert results == expected, "process pool results differ"
+    items = sum(len(items) for _, items in expected.values())
+    print(f"one at a time {serial_time:.2f}s, process pool {pool_time:.2f}s ({serial_time / pool_time:.1f}x, "
+          f"first file after {first:.2f}s), {items} items")
+
+if __name__ == "__main__":
+    main()
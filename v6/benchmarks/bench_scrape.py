@@ -0,0 +1,232 @@
+# benchmarks/bench_scrape.py
+#
+# Runs scrape_product_range end to end against a local stand-in for
+# pohary-bauer.cz that serves the synthetic fixture pages (see
+# bench_parse.py) and a fixture image, with optional latency and failure
+# injection. Reports throughput, p50/p95 request latency and peak memory
+# for:
+#
+#   cold     empty caches, everything is fetched
+#   revalid  scrape job removed but HTTP cache kept, pages revalidate (304)
+#   resumed  scrape job kept, listing pages revalidate and products are reused
+#
+# and exits non-zero if any run fails or doesn't return every product with
+# its image.
+#
+#   python benchmarks/bench_scrape.py --pages 5 --latency 80 --fail-rate 0.05
+#   python benchmarks/bench_scrape.py --trace-memory
+
+import os
+import re
+import sys
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import tracemalloc
+import resource
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Nothing may touch the real caches or go online for translations
+os.environ["TROPHY_CACHE_DIR"] = tempfile.mkdtemp(prefix="bench_scrape_")
+os.environ["TRANSLATION_OFFLINE"] = "1"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import scraper_http
+import scraping
+from scrape_jobs import remove_job
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Model codes in the listing fixture, e.g. 'F254.7' in text and 'f254-7' in links
+MODEL_TEXT = re.compile(r'\b([A-H])(\d{3})\.(\d)\b')
+MODEL_LINK = re.compile(r'/produkt/([a-h])(\d{3})-(\d)/')
+GALLERY_LINK = re.compile(r'//cdn\.pohary-bauer\.cz/img/A123\.4\.jpg')
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+class FixtureSite:
+    """Serves numbered listing pages built from the listing fixture (with
+    model codes made unique per page), a product page per model and the
+    fixture image, honouring If-None-Match."""
+
+    def __init__(self, pages, latency, jitter, fail_rate):
+        self.pages = pages
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.listing = read_fixture("listing.html").decode("utf-8")
+        self.product = read_fixture("product.html").decode("utf-8")
+        self.image = read_fixture("image.jpg")
+        self.responses = {}
+        self.requests = 0
+        self.failures = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler())
+        self.server.daemon_threads = True
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def listing_page(self, page):
+        if page > self.pages:
+            return self.listing.replace("swiper-slide cell cell--product", "empty-grid")
+        text = MODEL_TEXT.sub(lambda m: f"{m[1]}{m[2]}{page}.{m[3]}", self.listing)
+        return MODEL_LINK.sub(lambda m: f"/produkt/{m[1]}{m[2]}{page}-{m[3]}/", text)
+
+    def product_page(self, slug):
+        return GALLERY_LINK.sub(f"//127.0.0.1:{self.server.server_address[1]}/img/{slug}.jpg", self.product)
+
+    def respond(self, path):
+        # (status, content type, body, etag), built once per path so serving
+        # costs as little CPU as possible next to the scraper in this process
+        with self.lock:
+            if path not in self.responses:
+                status, content_type, body = self.build_response(path)
+                etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+                self.responses[path] = (status, content_type, body, etag)
+            return self.responses[path]
+
+    def build_response(self, path):
+        if path.startswith("/range"):
+            match = re.search(r"strana=(\d+)", path)
+            page = int(match[1]) if match else 1
+            return 200, "text/html; charset=utf-8", self.listing_page(page).encode("utf-8")
+        if path.startswith("/produkt/"):
+            slug = path.strip("/").split("/")[-1]
+            return 200, "text/html; charset=utf-8", self.product_page(slug).encode("utf-8")
+        if path.startswith("/img/"):
+            return 200, "image/jpeg", self.image
+        return 404, "text/plain", b"not found"
+
+    def handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def send(self, status, headers, body=b""):
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with site.lock:
+                    site.requests += 1
+                    fail = random.random() < site.fail_rate
+                    if fail:
+                        site.failures += 1
+                time.sleep(max(0.0, site.latency + random.uniform(-site.jitter, site.jitter)))
+                if fail:
+                    self.send(503, {"Retry-After": "0"})
+                    return
+                status, content_type, body, etag = site.respond(self.path)
+                if status == 200 and self.headers.get("If-None-Match") == etag:
+                    with site.lock:
+                        site.not_modified += 1
+                    self.send(304, {"ETag": etag})
+                    return
+                self.send(status, {"Content-Type": content_type, "ETag": etag}, body)
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def reset_counts(self):
+        with self.lock:
+            self.requests = self.failures = self.not_modified = 0
+
+def timed_session():
+    # Records the latency of every request the scraper makes
+    latencies = []
+    lock = threading.Lock()
+    request = scraper_http.session.request
+
+    def timed_request(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return request(*args, **kwargs)
+        finally:
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    scraper_http.session.request = timed_request
+    return latencies
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def run(site, url, latencies, label, expected, trace_memory):
+    # Peak memory is what tracemalloc saw allocated by Python during the run
+    # with --trace-memory (which slows everything down several times), or
+    # else the process's peak RSS so far
+    site.reset_counts()
+    latencies.clear()
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        df, _ = scraping.scrape_product_range(url, "Bench", "BENCH", "trophies", "acrylic")
+    except Exception as e:
+        if trace_memory:
+            tracemalloc.stop()
+        print(f"{label:<8} failed after {time.perf_counter() - start:.2f}s: {e}")
+        return False
+    elapsed = time.perf_counter() - start
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    else:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    images = int(df["temp_image_path"].notna().sum()) if len(df) else 0
+    print(f"{label:<8} {len(df):>5} products  {elapsed:6.2f}s  {len(df) / elapsed:7.1f} products/s  "
+          f"{len(latencies):>5} requests ({site.not_modified} x 304, {site.failures} failed)  "
+          f"p50 {percentile(latencies, 0.5) * 1000:6.1f} ms  p95 {percentile(latencies, 0.95) * 1000:6.1f} ms  "
+          f"peak {'traced' if trace_memory else 'RSS'} {peak / 1024 / 1024:5.1f} MB")
+    ok = len(df) == expected and images == expected
+    if not ok:
+        print(f"  expected {expected} products with images, got {len(df)} products and {images} images")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=5, help="listing pages in the range")
+    parser.add_argument("--latency", type=float, default=50, help="server latency per request in ms")
+    parser.add_argument("--jitter", type=float, default=20, help="random +/- latency in ms")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--trace-memory", action="store_true", help="measure peak memory with tracemalloc")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    site = FixtureSite(args.pages, args.latency / 1000, args.jitter / 1000, args.fail_rate)
+    site.start()
+    latencies = timed_session()
+    url = f"{site.base}/range/"
+    per_page = site.listing.count("swiper-slide cell cell--product")
+    expected = args.pages * per_page
+    print(f"{args.pages} pages x {per_page} products, {args.latency:.0f}±{args.jitter:.0f} ms latency, "
+          f"{args.fail_rate:.0%} failures, cache in {os.environ['TROPHY_CACHE_DIR']}")
+
+    ok = run(site, url, latencies, "cold", expected, args.trace_memory)
+    remove_job(url)
+    ok &= run(site, url, latencies, "revalid", expected, args.trace_memory)
+    ok &= run(site, url, latencies, "resumed", expected, args.trace_memory)
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# benchmarks/bench_transforms.py
+#
+# Compares the vectorized catalog transforms against the row-wise version
+# load_data used before, on a synthetic catalog, and checks both produce the
+# same frame.
+#
+#   python benchmarks/bench_transforms.py --models 20000 --sizes 5
+
+import os
+import sys
+import time
+import argparse
+import random
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from transforms import build_table_frame, build_metal_cups_frame
+
+BASE_URL = "https://example.supabase.co/storage/v1/object/public/trophies_acrylic/"
+
+def legacy_table_frame(prod_df, sizes_df, base_url):
+    ungrouped_df = pd.merge(prod_df, sizes_df, on='model', how='left')
+    grouped = ungrouped_df.groupby('model').agg({
+        'size': lambda x: list(x.dropna()),
+        'size_code': lambda x: list(x.dropna())
+    }).reset_index()
+    df = pd.merge(prod_df, grouped, on='model', how='left')
+    df['model_code_clean'] = df['model'].str.replace(" ", "_")
+    df['image url'] = base_url + df['model_code_clean'] + '.jpg'
+    df['product name'] = df.apply(
+        lambda row: f"{row['name']} {row['sport']} {row['type']}" if row['name'] else None, axis=1
+    )
+    df['range'] = df['name']
+    df = df[['product name', 'model', 'image url', 'size', 'size_code', 'product_code', 'range', 'sport']]
+    return df.rename(columns={'model': 'code', 'size': 'sizes', 'size_code': 'size_codes'})
+
+def legacy_metal_cups_frame(metal_cups_df):
+    metal_cups_df = metal_cups_df.copy()
+    metal_cups_df['product name'] = metal_cups_df.apply(
+        lambda row: f"{row['name']} {row['colour']} Metal Cup", axis=1
+    )
+    metal_cups_df['image url'] = metal_cups_df['image_url']
+    metal_cups_df['size_codes'] = metal_cups_df['sizes']
+    metal_cups_df['product_code'] = metal_cups_df['code']
+    metal_cups_df['range'] = metal_cups_df['name']
+    metal_cups_df['sport'] = None
+    return metal_cups_df[['product name', 'code', 'image url', 'sizes', 'size_codes', 'product_code', 'range', 'sport']]
+
+def make_catalog(models, sizes):
+    random.seed(0)
+    sports = ['Football', 'Tennis', 'Rugby', 'Golf', 'Darts', None]
+    prod_rows = [{
+        'model': f"ACL{i // 40:04d} M{i % 40}",
+        'name': random.choice(['Star Range', 'Shield', None, '']),
+        'sport': random.choice(sports),
+        'type': 'Trophies Acrylic',
+        'product_code': f"ACL{i // 40:04d}",
+    } for i in range(models)]
+    size_rows = [{
+        'model': row['model'],
+        'size': 100 - 10 * s,
+        'size_code': row['model'] + chr(65 + s),
+    } for row in prod_rows for s in range(sizes)]
+    random.shuffle(size_rows)
+    cups = pd.DataFrame([{
+        'code': f"MC{i}", 'name': 'Metal Cup', 'colour': random.choice(['Gold', 'Silver', None]),
+        'image_url': f"https://example.com/MC{i}.jpg", 'sizes': [200, 250, 300],
+    } for i in range(models // 10)])
+    return pd.DataFrame(prod_rows), pd.DataFrame(size_rows), cups
+
+def timed(fn, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--models', type=int, default=20000)
+    parser.add_argument('--sizes', type=int, default=5)
+    args = parser.parse_args()
+
+    prod_df, sizes_df, cups_df = make_catalog(args.models, args.sizes)
+
+    old, old_time = timed(legacy_table_frame, prod_df, sizes_df, BASE_URL)
+    new, new_time = timed(build_table_frame, prod_df, sizes_df, BASE_URL)
+    # The legacy builders predate the thumbnail column
+    pd.testing.assert_frame_equal(old.reset_index(drop=True), new.drop(columns='thumbnail url').reset_index(drop=True))
+    print(f"product table ({len(prod_df)} models, {len(sizes_df)} sizes): "
+          f"{old_time * 1000:.0f}ms -> {new_time * 1000:.0f}ms ({old_time / new_time:.1f}x)")
+
+    old, old_time = timed(legacy_metal_cups_frame, cups_df)
+    new, new_time = timed(build_metal_cups_frame, cups_df)
+    pd.testing.assert_frame_equal(old, new.drop(columns='thumbnail url'))
+    print(f"metal_cups ({len(cups_df)} rows): "
+          f"{old_time * 1000:.1f}ms -> {new_time * 1000:.1f}ms ({old_time / new_time:.1f}x)")
+
+if __name__ == "__main__":
+    main()
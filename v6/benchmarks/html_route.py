@@ -0,0 +1,47 @@
+# benchmarks/html_route.py
+#
+# The Ribbon Tracker's text extraction before pdf_text_blocks: pdfminer's
+# HTML output cleaned up with BeautifulSoup, one block per div. Kept here as
+# the reference the benchmarks check ribbon_parsing against.
+
+import os
+import sys
+from io import BytesIO, StringIO
+
+import pdfminer.high_level
+from pdfminer.layout import LAParams
+from bs4 import BeautifulSoup, NavigableString
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ribbon_parsing import parse_amazon_lines, parse_supplier_lines
+
+def pdf_to_html(file: BytesIO) -> str:
+    output = StringIO()
+    laparams = LAParams()
+    pdfminer.high_level.extract_text_to_fp(
+        file,
+        output,
+        laparams=laparams,
+        output_type="html",
+        codec=None
+    )
+    return output.getvalue()
+
+def clean_html(raw_html: str) -> BeautifulSoup:
+    soup = BeautifulSoup(raw_html, "html.parser")
+    for span in soup.find_all("span"):
+        if not span.text.strip():
+            span.decompose()
+    for element in soup.find_all(string=True):
+        if isinstance(element, NavigableString) and not element.strip():
+            element.extract()
+    return soup
+
+def div_blocks(soup):
+    return [div.get_text() for div in soup.find_all("div")]
+
+def parse_amazon_orders(soup):
+    return parse_amazon_lines(div_blocks(soup))
+
+def parse_supplier_clipon_ribbons(soup):
+    return parse_supplier_lines(div_blocks(soup))
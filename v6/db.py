@@ -0,0 +1,72 @@
+# db.py
+import streamlit as st
+from postgrest import SyncRequestBuilder, SyncRPCFilterRequestBuilder
+from storage3._sync.file_api import SyncBucketProxy
+from supabase import Client, create_client
+from supabase.lib.client_options import SyncClientOptions
+
+supabase_url = st.secrets["connections"]["supabase"]["SUPABASE_URL"]
+supabase_key = st.secrets["connections"]["supabase"]["SUPABASE_KEY"]
+
+# Request timeouts in seconds
+QUERY_TIMEOUT = 30
+STORAGE_TIMEOUT = 120
+
+@st.cache_resource
+def get_client() -> Client:
+    # One Supabase client for the whole process, shared by every page,
+    # session and worker thread. Its PostgREST and Storage sessions are
+    # HTTP/2 httpx clients with keep-alive pools, so repeated queries reuse
+    # warm connections and reruns never build a new client.
+    options = SyncClientOptions(
+        postgrest_client_timeout=QUERY_TIMEOUT,
+        storage_client_timeout=STORAGE_TIMEOUT,
+    )
+    return create_client(supabase_url, supabase_key, options)
+
+supabase = get_client()
+
+def execute_query(query):
+    # Runs a query on the shared client. Nothing is cached, so writes always
+    # reach the database and reads are always current.
+    return query.execute()
+
+# --- Table accessors ---
+def table(name: str) -> SyncRequestBuilder:
+    return supabase.table(name)
+
+def products_table(product_type: str) -> SyncRequestBuilder:
+    # product_type is '{category}_{material}', e.g. 'trophies_acrylic'
+    return supabase.table(product_type)
+
+def sizes_table(product_type: str) -> SyncRequestBuilder:
+    return supabase.table(f"{product_type}_sizes")
+
+def product_sizes() -> SyncRequestBuilder:
+    return supabase.table("product_sizes")
+
+def metal_cups() -> SyncRequestBuilder:
+    return supabase.table("metal_cups")
+
+def name_reference() -> SyncRequestBuilder:
+    return supabase.table("name_reference")
+
+def ribbons() -> SyncRequestBuilder:
+    return supabase.table("ribbons")
+
+def website_orders() -> SyncRequestBuilder:
+    return supabase.table("website_orders")
+
+def website_codes_categories() -> SyncRequestBuilder:
+    return supabase.table("website_codes_categories")
+
+# --- Database functions (defined in sql/) ---
+def rpc(function: str, params: dict) -> SyncRPCFilterRequestBuilder:
+    return supabase.rpc(function, params)
+
+# --- Storage ---
+def bucket(name: str) -> SyncBucketProxy:
+    return supabase.storage.from_(name)
+
+def public_url(bucket_name: str, path: str) -> str:
+    return f"{supabase_url}/storage/v1/object/public/{bucket_name}/{path}"
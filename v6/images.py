@@ -0,0 +1,54 @@
+# images.py
+import io
+import os
+from PIL import Image, ImageOps
+
+# Storage keys of the variants made for each product image, next to the
+# original '<name>.jpg' in the product table's bucket
+THUMB_PREFIX = "thumbs/"
+WEBP_PREFIX = "webp/"
+
+# Thumbnails fit in this box, twice the 175px the search list shows them at
+# so they stay sharp on high-density screens
+THUMB_SIZE = (350, 350)
+THUMB_QUALITY = 75
+
+# The full WebP variant is capped to this box
+WEBP_MAX_SIZE = (1600, 1600)
+WEBP_QUALITY = 82
+
+def variant_keys(file_name):
+    # Storage keys of the thumbnail and WebP variant of an original image
+    stem = os.path.splitext(file_name)[0]
+    return {
+        "thumb": f"{THUMB_PREFIX}{stem}.webp",
+        "webp": f"{WEBP_PREFIX}{stem}.webp",
+    }
+
+def load_image(source):
+    # Opens a path or raw bytes, applies the EXIF orientation to the pixels
+    # and returns an RGB(A) image with no metadata attached
+    image = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+    image = ImageOps.exif_transpose(image)
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    image = image.convert("RGBA" if has_alpha else "RGB")
+    image.info.clear()
+    return image
+
+def encode_webp(image, max_size, quality):
+    resized = image.copy()
+    resized.thumbnail(max_size, Image.LANCZOS)
+    buffer = io.BytesIO()
+    # Saved without exif/icc/xmp, so none of the original metadata survives
+    resized.save(buffer, format="WEBP", quality=quality, method=4)
+    return buffer.getvalue()
+
+def make_variants(source, file_name):
+    # {storage key: WebP bytes} for the thumbnail and full WebP variant of
+    # one image, given as a path or bytes
+    image = load_image(source)
+    keys = variant_keys(file_name)
+    return {
+        keys["thumb"]: encode_webp(image, THUMB_SIZE, THUMB_QUALITY),
+        keys["webp"]: encode_webp(image, WEBP_MAX_SIZE, WEBP_QUALITY),
+    }
@@ -1,11 +1,10 @@
 import streamlit as st
 import pandas as pd
-from st_supabase_connection import SupabaseConnection
-from utils import load_data  # Import load_data from utils
 
 st.set_page_config(layout="wide")
 
-supabase = st.connection("supabase", type=SupabaseConnection)
+from db import name_reference, table
+from utils import load_data  # Import load_data from utils
 
 st.title("All products")
 st.page_link("Trophy_manager.py", label="**Back**", icon="⬅️")
@@ -41,12 +40,12 @@ def execute_query(_query):
 def update_product_name(code, new_name):
     try:
         # Step 1: Update name_reference table with new name
-        update_name_ref = supabase.table("name_reference").update({"name": new_name}).eq("code", code)
+        update_name_ref = name_reference().update({"name": new_name}).eq("code", code)
         testresp = execute_query(update_name_ref)
         print(f"Executed update name ref, {testresp.data}")
         
         # Step 2: Fetch the source from name_reference
-        fetch_source = supabase.table("name_reference").select("source").eq("code", code)
+        fetch_source = name_reference().select("source").eq("code", code)
         response = execute_query(fetch_source)
         print(f"Executed fetch source, response: {response.data}")
         
@@ -56,7 +55,7 @@ def update_product_name(code, new_name):
             print(f"Source table: {source_table}")
             
             # Step 4: Update the name in the source table using product_code
-            update_source_table = supabase.table(source_table).update({"name": new_name}).eq("product_code", code)
+            update_source_table = table(source_table).update({"name": new_name}).eq("product_code", code)
             
             # Log the query for debugging
             print(f"Updating source table: {source_table} with product_code: {code} and new_name: {new_name}")
@@ -104,18 +103,22 @@ def display_tables(df_with_range, df_without_range):
     # Reduce both DataFrames to display only the necessary columns: code, number of products, name (range)
     
     # For products with a UK name, we can safely count the 'product name' since 'range' is not null
-    with_range_summary = df_with_range.groupby('product code').agg({
+    # 'product code' and 'range' are categoricals in the shared catalog, so only
+    # observed groups are kept and the summaries go back to plain text for editing
+    with_range_summary = df_with_range.groupby('product code', observed=True).agg({
         'product code': 'first',
         'product name': 'count',  # This works because there are no missing 'product name' values
         'range': 'first'
     }).rename(columns={'product name': 'Number of Products'}).reset_index(drop=True)
+    with_range_summary = with_range_summary.astype({'product code': object, 'range': object})
 
     # For products without a UK name, we should use size() to count all rows, even if 'product name' is NaN
-    without_range_summary = df_without_range.groupby('product code').agg({
+    without_range_summary = df_without_range.groupby('product code', observed=True).agg({
         'product code': 'first',
         'code': 'count',  # This counts all occurrences of 'product code' regardless of NaN values
         'range': 'first'
     }).rename(columns={'code': 'Number of Products'}).reset_index(drop=True)
+    without_range_summary = without_range_summary.astype({'product code': object, 'range': object})
 
     # Display tables side by side
     a, col1, col2, b = st.columns([1.5, 2, 2, 1.5])
@@ -1,13 +1,14 @@
 import streamlit as st
 import pandas as pd
-from st_supabase_connection import SupabaseConnection, execute_query
-from supabase import create_client, Client
 from io import BytesIO
 import time
 
 # Set page configuration
 st.set_page_config(page_title="CRM Dashboard", layout="wide")
 
+from db import execute_query, website_orders
+from utils import read_table
+
 # Check authentication
 if "authenticated" not in st.session_state:
     st.session_state["authenticated"] = False
@@ -24,14 +25,6 @@ if not st.session_state["authenticated"]:
             st.error("Incorrect password. Please try again.")
     st.stop()
 
-# Initialize Supabase connection
-supabase = st.connection("supabase", type=SupabaseConnection)
-supabase_url = st.secrets["connections"]["supabase"]["SUPABASE_URL"]
-supabase_key = st.secrets["connections"]["supabase"]["SUPABASE_KEY"]
-
-# Initialize Supabase client
-supabase_client: Client = create_client(supabase_url, supabase_key)
-
 # Page Title and Navigation
 st.title("CRM Dashboard")
 st.page_link("Trophy_manager.py", label="**Back to Trophy Manager**", icon="⬅️")
@@ -48,19 +41,17 @@ if 'upload_complete' not in st.session_state:
 @st.cache_data(ttl=600)
 def get_merged_data():
     try:
-        # Fetch data from 'website_orders'
-        orders_response = execute_query(supabase.table("website_orders").select("*"), ttl=0)
-        if not hasattr(orders_response, 'data') or not orders_response.data:
+        # Fetch data from 'website_orders' (paginated, it is well past the row cap)
+        orders_df = read_table("website_orders", order_by="ID")
+        if orders_df.empty:
             st.error("No data found in 'website_orders' table.")
             return pd.DataFrame()
-        orders_df = pd.DataFrame(orders_response.data)
         
         # Fetch data from 'website_codes_categories'
-        categories_response = execute_query(supabase.table("website_codes_categories").select("*"), ttl=0)
-        if not hasattr(categories_response, 'data') or not categories_response.data:
+        categories_df = read_table("website_codes_categories", order_by="Code")
+        if categories_df.empty:
             st.error("No data found in 'website_codes_categories' table.")
             return pd.DataFrame()
-        categories_df = pd.DataFrame(categories_response.data)
         
         # Perform left join on 'Code'
         merged_df = orders_df.merge(categories_df, on='Code', how='left')
@@ -277,7 +268,7 @@ if uploaded_file is not None and not st.session_state['upload_complete']:
 
             for i in range(0, total, batch_size):
                 batch = orders_to_insert[i:i + batch_size]
-                response = supabase_client.table("website_orders").insert(batch).execute()
+                response = execute_query(website_orders().insert(batch))
 
                 if response:
                     st.write(f"Batch {i//batch_size + 1} inserted successfully.")
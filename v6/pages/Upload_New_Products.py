@@ -2,10 +2,12 @@ import os
 import streamlit as st
 import pandas as pd
 from scraping import scrape_product_range
+from scrape_jobs import remove_job
 from backend import (
     insert_products_to_supabase,
     upload_images_to_supabase,
     insert_sizes_and_update_sizes_table,
+    backfill_image_variants,
 )
 
 # Define the materials dictionary
@@ -20,12 +22,35 @@ def format_product_type(product_type):
 
 st.title("Upload New Products")
 
-# Reset button: clears all session state and cached data.
+# Reset button: clears all session state and cached data, along with the
+# checkpointed scrape of the URL so the next scrape starts from scratch.
 if st.button("Reset Upload"):
+    if st.session_state.get("url_input"):
+        remove_job(st.session_state.url_input)
     st.session_state.clear()
     st.cache_data.clear()
     st.rerun()
     
+# Thumbnails for products uploaded before they were made on upload.
+with st.expander("Generate missing thumbnails"):
+    if st.button("Generate"):
+        backfill_progress = st.progress(0)
+        backfill_status = st.empty()
+        buckets = [f"{category}_{material}" for category, materials in materials_dict.items() for material in materials]
+        failed = 0
+        for number, bucket_name in enumerate(buckets):
+            def on_variants_made(done, total, file_name, error):
+                backfill_progress.progress((number + done / total) / len(buckets))
+                backfill_status.write(f"{bucket_name}: {done}/{total} images (last: {file_name})")
+            try:
+                failed += len(backfill_image_variants(bucket_name, on_variants_made))
+            except Exception as e:
+                st.error(f"Could not generate thumbnails for '{bucket_name}': {e}")
+            backfill_progress.progress((number + 1) / len(buckets))
+        if failed:
+            st.warning(f"{failed} images could not be converted.")
+        st.success("Thumbnails are up to date.")
+
 # Use a session state variable to control workflow.
 if "current_step" not in st.session_state:
     st.session_state.current_step = "input"  # Options: "input", "preview", "final"
@@ -85,7 +110,14 @@ if st.session_state.current_step == "preview":
         st.write("Scraping products from the provided URL. Please wait...")
         # Create a progress bar for scraping products.
         progress_bar = st.progress(0)
-        df, temp_dir = scrape_product_range(url, range_name, range_code, product_category, product_material, progress_bar)
+        try:
+            df, temp_dir = scrape_product_range(url, range_name, range_code, product_category, product_material, progress_bar)
+        except Exception as e:
+            # What was scraped is kept; clicking the button reruns the page,
+            # which scrapes again from there
+            st.error(f"Scraping failed: {e}")
+            st.button("Try again")
+            st.stop()
         st.session_state.df = df
         st.session_state.temp_dir = temp_dir
 
@@ -150,14 +182,27 @@ if st.session_state.current_step == "final":
         backend_progress.progress(0.33)
         
         st.write("Uploading product images...")
-        upload_images_to_supabase(updated_products)
+        upload_status = st.empty()
+
+        def on_image_uploaded(done, total, product, error):
+            backend_progress.progress(0.33 + 0.33 * done / total)
+            upload_status.write(f"Uploaded {done}/{total} images (last: {product['model']})")
+
+        image_errors = upload_images_to_supabase(updated_products, on_image_uploaded)
         backend_progress.progress(0.66)
         
         st.write("Uploading sizes...")
         sizes_str = st.session_state.get("final_sizes", "")
         sizes_list = sizes_str.split() if sizes_str else []
-        insert_sizes_and_update_sizes_table(updated_products, sizes_list)
+        size_errors = insert_sizes_and_update_sizes_table(updated_products, sizes_list)
         backend_progress.progress(1.0)
+        if size_errors:
+            st.warning(f"{len(size_errors)} size rows could not be inserted, see the errors above.")
+
+        # Once every image is up, the scrape's checkpoint and images aren't
+        # needed anymore
+        if not image_errors:
+            remove_job(st.session_state.url_input)
         
         st.success("All backend steps completed!")
     
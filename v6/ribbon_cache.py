@@ -0,0 +1,123 @@
+# ribbon_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from atomic_files import write_atomic
+from settings import CACHE_DIR
+from ribbon_parsing import parse_pdfs
+
+# One JSON file per parsed PDF, named by the sha256 of its bytes
+PARSE_CACHE_DIR = os.path.join(CACHE_DIR, "ribbon_parses")
+
+# Bumped whenever a parser change makes earlier results stale
+PARSER_VERSION = 2
+
+# Parses kept in memory for reruns, least recently used dropped first
+MEMORY_ENTRIES = 256
+
+# Parse files not used for this many seconds are deleted when the next batch
+# is parsed. Applied ones go too: applying a PDF again is turned away by the
+# stock ledger, the cache only adds the warning when it's uploaded.
+PARSE_MAX_AGE = 30 * 24 * 3600
+
+memory = OrderedDict()
+memory_lock = threading.Lock()
+
+def pdf_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+def entry_path(digest):
+    return os.path.join(PARSE_CACHE_DIR, f"{digest}.json")
+
+def prune_parses(max_age=PARSE_MAX_AGE):
+    # Also removes temp files left by interrupted writes
+    if not os.path.isdir(PARSE_CACHE_DIR):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(PARSE_CACHE_DIR):
+        path = os.path.join(PARSE_CACHE_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            continue
+
+def remember(digest, entry):
+    with memory_lock:
+        memory[digest] = entry
+        memory.move_to_end(digest)
+        while len(memory) > MEMORY_ENTRIES:
+            memory.popitem(last=False)
+
+def cached_parse(digest):
+    # The cached entry for a PDF ({name, detected_type, items, parsed_at,
+    # applied_at}), from memory or disk, or None. Its file is touched so
+    # prune_parses keeps it.
+    path = entry_path(digest)
+    with memory_lock:
+        entry = memory.get(digest)
+        if entry is not None:
+            memory.move_to_end(digest)
+    if entry is None:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("version") != PARSER_VERSION:
+            return None
+        remember(digest, entry)
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return entry
+
+def save_entry(digest, entry):
+    data = json.dumps(entry, ensure_ascii=False).encode('utf-8')
+    write_atomic(entry_path(digest), data)
+    remember(digest, entry)
+
+def store_parse(digest, name, detected_type, items):
+    entry = {
+        "version": PARSER_VERSION,
+        "name": name,
+        "detected_type": detected_type,
+        "items": items,
+        "parsed_at": time.time(),
+        "applied_at": None,
+    }
+    save_entry(digest, entry)
+    return entry
+
+def mark_applied(digests):
+    # Records that these PDFs' items have been taken off the stock
+    applied_at = time.time()
+    for digest in set(digests):
+        entry = cached_parse(digest)
+        if entry is not None:
+            save_entry(digest, dict(entry, applied_at=applied_at))
+
+def parse_uploads(files):
+    # Yields (name, digest, entry) for each (name, bytes) PDF, cached ones
+    # straight away and the rest as parse_pdfs finishes them. Identical
+    # PDFs in one batch are parsed once.
+    prune_parses()
+    digests = [(name, pdf_digest(data), data) for name, data in files]
+    pending = {}
+    for name, digest, data in digests:
+        entry = cached_parse(digest)
+        if entry is not None:
+            yield name, digest, entry
+        else:
+            pending.setdefault(digest, ([], data))[0].append(name)
+
+    for digest, detected_type, items in parse_pdfs([(digest, data) for digest, (_, data) in pending.items()]):
+        names = pending[digest][0]
+        entry = store_parse(digest, names[0], detected_type, items)
+        for name in names:
+            yield name, digest, entry
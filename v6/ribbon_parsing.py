@@ -0,0 +1,272 @@
+# ribbon_parsing.py
+import os
+import re
+import collections
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pdfminer.high_level
+from pdfminer.layout import LAParams, LTChar, LTFigure, LTTextBox, LTTextLine
+from io import BytesIO
+import pandas as pd
+
+# --- Regex patterns ---
+ORDER_ID_RE = re.compile(r"\d{3}-\d{7}-\d{7}")
+PACK_QTY_RE = re.compile(r'(\d+)x\b')
+
+# --- Amazon packing slip markers ---
+DISPATCH_MARKER = "Dispatch to:"
+QUANTITY_HEADER = "Quantity  Product Details"
+RIBBON_MARKER = "Type your clip-on ribbon colour choice here"
+
+# The quantity header is looked for this many blocks from "Dispatch to:",
+# the order ID this many
+QUANTITY_HEADER_WINDOW = 200
+ORDER_ID_WINDOW = 50
+
+# Order ID of items whose slip has none that could be read
+UNKNOWN_ORDER = "UNKNOWN"
+
+# PDFs parsed at once, each in its own process as pdfminer's layout
+# analysis is CPU bound. RIBBON_PDF_WORKERS overrides the core count.
+PDF_WORKERS = int(os.environ.get("RIBBON_PDF_WORKERS", 0)) or os.cpu_count() or 1
+
+# --- Utilities ---
+def is_integer(text):
+    try:
+        int(text.strip())
+        return True
+    except ValueError:
+        return False
+
+def is_price(text):
+    return "£" in text
+
+def div_texts(item):
+    # Text of the div pdfminer's HTML output has for a text box or figure,
+    # once the old BeautifulSoup clean-up (benchmarks/html_route.py) is
+    # done, followed by those of figures inside it. The HTML puts each run
+    # of characters in one font in a span and ends each line with <br>; the
+    # clean-up drops the spans and text between tags that are only
+    # whitespace. This copies what HTMLConverter does in pdfminer.six
+    # 20250506, the version pinned in requirements.txt; other versions lay
+    # out the HTML differently, so check benchmarks/bench_ribbon_pdfs.py
+    # still passes before changing the pin.
+    spans = []
+    nested = []
+    font = None
+
+    def put(text, char_font=None):
+        nonlocal font
+        if not spans or (char_font is not None and char_font != font):
+            spans.append([""])
+            font = char_font
+        spans[-1][-1] += text
+
+    for child in item:
+        if isinstance(child, LTTextLine):
+            for char in child:
+                put(char.get_text(), (char.fontname, char.size) if isinstance(char, LTChar) else None)
+            if spans:
+                spans[-1].append("")
+        elif isinstance(child, LTChar):
+            put(child.get_text(), (child.fontname, child.size))
+        elif isinstance(child, LTFigure):
+            inner = div_texts(child)
+            put(inner[0])
+            nested += inner
+
+    text = "".join(
+        node
+        for span in spans if "".join(span).strip()
+        for node in span if node.strip()
+    )
+    return [text] + nested
+
+def pdf_text_blocks(file):
+    # The text of each div the HTML route gave, in the same order, straight
+    # from pdfminer's layout one page at a time
+    pages = 0
+    for page in pdfminer.high_level.extract_pages(file, laparams=LAParams()):
+        pages += 1
+        yield f"Page {page.pageid}"
+        for item in page:
+            if isinstance(item, (LTTextBox, LTFigure)):
+                yield from div_texts(item)
+    # The footer linking to every page
+    yield "Page: " + ", ".join(str(number) for number in range(1, pages + 1))
+
+def normalise_colour(colour: str) -> str:
+    colour = colour.replace("/", "-")
+    colour = colour.replace(" and ", "-")
+    colour = re.sub(r'(?<=[a-z])([A-Z])', r'-\1', colour)
+    return colour.lower().strip()
+
+# --- Amazon parser ---
+def ribbon_colour_from(line, next_line):
+    # Colour chosen on a "Type your clip-on ribbon colour choice here" line.
+    # A short following line is taken as the rest of a colour that wrapped.
+    if "::" in line:
+        colour_part = line.split("::", 1)[1].strip()
+    elif ":" in line:
+        colour_part = line.split(":", 1)[1].strip()
+    else:
+        colour_part = line.strip()
+
+    if next_line is not None:
+        next_line = next_line.strip()
+        upper = next_line.upper()
+        if (
+            len(next_line.split()) <= 5 and
+            "VAT" not in upper and
+            "PAGE" not in upper and
+            "TOTAL" not in upper and
+            ":" not in next_line and
+            not is_integer(next_line) and
+            next_line
+        ):
+            colour_part += " " + next_line
+
+    return normalise_colour(colour_part)
+
+def parse_amazon_block(lines):
+    # Items of one order's product table, given its non-empty lines after the
+    # quantity header. One pass: a line item starts wherever a quantity,
+    # description and price line follow each other (outside the three lines
+    # of the item before), and the lines up to the next item belong to it.
+    # In a "Pack of" item the last "::" line with an 'Nx' count sets the
+    # pack size; the first ribbon colour line sets the colour.
+    items = []
+    total = len(lines)
+    item = None
+    next_start = 0
+    for k, line in enumerate(lines):
+        if (k >= next_start and k + 2 < total
+                and is_integer(line) and lines[k + 1] and is_price(lines[k + 2])):
+            base_qty = int(line)
+            item = {
+                "ribbon_colour": "",
+                "final_qty": base_qty,
+                "base_qty": base_qty,
+                "is_pack": "Pack of" in lines[k + 1],
+                "has_colour": False,
+            }
+            items.append(item)
+            next_start = k + 3
+            continue
+        if item is None or k < next_start:
+            continue
+        if item["is_pack"] and "::" in line and "x" in line:
+            m = PACK_QTY_RE.search(line)
+            if m:
+                item["final_qty"] = item["base_qty"] * int(m.group(1))
+        if not item["has_colour"] and RIBBON_MARKER in line:
+            item["ribbon_colour"] = ribbon_colour_from(line, lines[k + 1] if k + 1 < total else None)
+            item["has_colour"] = True
+
+    return [{"ribbon_colour": item["ribbon_colour"], "final_qty": item["final_qty"]} for item in items]
+
+def parse_amazon_lines(texts):
+    # Ribbon line items from the text of each block of an Amazon packing
+    # slip, in document order, each with the order ID on its slip. Each
+    # block's text is looked at once: the positions of the next quantity
+    # header and next order ID after every block are found in one backward
+    # pass, and each order's product table (quantity header up to the next
+    # order ID) is parsed once, however many "Dispatch to:" blocks lead to
+    # it.
+    total = len(texts)
+    stripped = [text.strip() for text in texts]
+
+    next_quantity = [total] * (total + 1)
+    next_order = [total] * (total + 1)
+    for k in range(total - 1, -1, -1):
+        next_quantity[k] = k if QUANTITY_HEADER in texts[k] else next_quantity[k + 1]
+        next_order[k] = k if stripped[k] and ORDER_ID_RE.search(stripped[k]) else next_order[k + 1]
+
+    blocks = {}
+    orders_items = []
+    for idx, text in enumerate(texts):
+        if DISPATCH_MARKER not in text:
+            continue
+        quantity_idx = next_quantity[idx]
+        # A header at the very first block doesn't count, as before
+        if quantity_idx >= min(idx + QUANTITY_HEADER_WINDOW, total) or not quantity_idx:
+            continue
+        if quantity_idx not in blocks:
+            content = [t for t in stripped[quantity_idx + 1:next_order[quantity_idx + 1]] if t]
+            has_ribbons = any(RIBBON_MARKER in t for t in content)
+            blocks[quantity_idx] = parse_amazon_block(content) if has_ribbons else []
+        order_idx = next_order[idx]
+        order_id = UNKNOWN_ORDER
+        if order_idx < min(idx + ORDER_ID_WINDOW, total):
+            order_id = ORDER_ID_RE.search(stripped[order_idx]).group()
+        orders_items.extend(dict(item, order_id=order_id) for item in blocks[quantity_idx])
+
+    return orders_items
+
+# --- Supplier parser ---
+def parse_supplier_lines(texts):
+    results = []
+
+    for idx, text in enumerate(texts):
+        text = text.strip()
+
+        if "Clip on Medal Ribbon" in text:
+            colour = text.split("Clip on Medal Ribbon")[0].strip()
+            colour = normalise_colour(colour)
+
+            qty = 0
+            if idx + 1 < len(texts):
+                next_text = texts[idx + 1].strip()
+                m = re.search(r"(\d+)\s*ks", next_text)
+                if m:
+                    qty = int(m.group(1))
+
+            results.append({
+                "ribbon_colour": colour,
+                "final_qty": qty,
+                "order_id": ""
+            })
+
+    return results
+
+# --- Whole PDFs ---
+def parse_pdf(data):
+    # (detected type, items) for the bytes of one Amazon or supplier PDF
+    texts = list(pdf_text_blocks(BytesIO(data)))
+    if any("dispatch to:" in text.lower() for text in texts):
+        return "Amazon", parse_amazon_lines(texts)
+    return "Supplier", parse_supplier_lines(texts)
+
+def pdf_process_context():
+    # Workers aren't forked straight from the app, whose other threads may
+    # hold locks at the time. Where there's a fork server it imports this
+    # module once, rather than each worker importing pdfminer and pandas.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context("spawn")
+
+def parse_pdfs(files):
+    # Yields (name, detected type, items) for each (name, bytes) PDF as soon
+    # as it's parsed, several at once in a process pool. A single PDF is
+    # parsed here rather than paying for a worker process.
+    workers = min(PDF_WORKERS, len(files))
+    if workers <= 1:
+        for name, data in files:
+            yield (name, *parse_pdf(data))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=pdf_process_context()) as executor:
+        futures = {executor.submit(parse_pdf, data): name for name, data in files}
+        for future in as_completed(futures):
+            yield (futures[future], *future.result())
+
+# --- Shared summary ---
+def make_summary(items):
+    counts = collections.Counter()
+    for item in items:
+        counts[item['ribbon_colour']] += int(item['final_qty'])
+
+    df = pd.DataFrame([{"colour": k, "quantity": v} for k, v in counts.items()])
+    return df
@@ -0,0 +1,148 @@
+# scrape_jobs.py
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from atomic_files import write_atomic
+from settings import CACHE_DIR
+
+# One directory per scraped URL, holding its manifest and downloaded images
+JOBS_DIR = os.path.join(CACHE_DIR, "scrape_jobs")
+
+# Jobs untouched for this many seconds are deleted when the next one starts
+JOB_MAX_AGE = 7 * 24 * 3600
+
+# Seconds between manifest writes while a scrape is running
+CHECKPOINT_INTERVAL = 2
+
+def job_key(url):
+    return hashlib.sha256(url.rstrip('/').encode('utf-8')).hexdigest()[:16]
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def prune_jobs(max_age=JOB_MAX_AGE):
+    if not os.path.isdir(JOBS_DIR):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(JOBS_DIR):
+        job_dir = os.path.join(JOBS_DIR, name)
+        manifest_path = os.path.join(job_dir, "manifest.json")
+        try:
+            updated = os.path.getmtime(manifest_path if os.path.exists(manifest_path) else job_dir)
+        except OSError:
+            continue
+        if updated < cutoff:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+def remove_job(url):
+    # Deletes a finished job and its images
+    shutil.rmtree(os.path.join(JOBS_DIR, job_key(url)), ignore_errors=True)
+
+class ScrapeJob:
+    """Checkpointed state of one scrape: listing pages read, products done
+    and the images downloaded for them, kept in manifest.json so a scrape
+    of the same URL picks up where the last one stopped."""
+
+    def __init__(self, url):
+        self.url = url
+        self.dir = os.path.join(JOBS_DIR, job_key(url))
+        self.images_dir = os.path.join(self.dir, "images")
+        self.manifest_path = os.path.join(self.dir, "manifest.json")
+        self.lock = threading.Lock()
+        self.last_saved = 0.0
+        os.makedirs(self.images_dir, exist_ok=True)
+        self.manifest = self._load()
+
+    def _load(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get("url") == self.url:
+                # Listing pages are only reused to finish an interrupted
+                # listing. Once an earlier run has read to the last page they
+                # are fetched again (conditional GETs, so unchanged pages are
+                # cheap) and products added since are picked up; the products
+                # done are still reused.
+                if manifest["last_page"] is not None:
+                    manifest["pages"] = {}
+                    manifest["last_page"] = None
+                return manifest
+        except (OSError, ValueError):
+            pass
+        return {"url": self.url, "pages": {}, "last_page": None, "products": {}}
+
+    @classmethod
+    def open(cls, url):
+        prune_jobs()
+        return cls(url)
+
+    @property
+    def resumed(self):
+        return bool(self.manifest["pages"] or self.manifest["products"])
+
+    def listing_page(self, page):
+        # (True, entries) for a page read before, entries being None past the
+        # last page, or (False, None) if it still has to be fetched
+        with self.lock:
+            last_page = self.manifest["last_page"]
+            if last_page is not None and page >= last_page:
+                return True, None
+            entries = self.manifest["pages"].get(str(page))
+        if entries is None:
+            return False, None
+        return True, [tuple(entry) for entry in entries]
+
+    def record_listing_page(self, page, entries):
+        with self.lock:
+            if entries is None:
+                last_page = self.manifest["last_page"]
+                self.manifest["last_page"] = page if last_page is None else min(last_page, page)
+            else:
+                self.manifest["pages"][str(page)] = [list(entry) for entry in entries]
+        self.checkpoint()
+
+    def product(self, key):
+        # The saved result for a product, provided its image is still on disk
+        # unchanged
+        with self.lock:
+            info = self.manifest["products"].get(key)
+        if info is None:
+            return None
+        info = dict(info)
+        path = os.path.join(self.images_dir, info["image_file"])
+        if not os.path.exists(path) or file_sha256(path) != info["sha256"]:
+            return None
+        info["temp_image_path"] = path
+        return info
+
+    def record_product(self, key, info):
+        # Only products whose image was downloaded are recorded, the rest are
+        # tried again next time
+        path = info["temp_image_path"]
+        if not path:
+            return
+        saved = {field: value for field, value in info.items() if field != "temp_image_path"}
+        saved["image_file"] = os.path.basename(path)
+        saved["sha256"] = file_sha256(path)
+        with self.lock:
+            self.manifest["products"][key] = saved
+        self.checkpoint()
+
+    def checkpoint(self):
+        if time.monotonic() - self.last_saved >= CHECKPOINT_INTERVAL:
+            self.save()
+
+    def save(self):
+        with self.lock:
+            self.manifest["updated_at"] = time.time()
+            data = json.dumps(self.manifest, ensure_ascii=False).encode('utf-8')
+            write_atomic(self.manifest_path, data)
+            self.last_saved = time.monotonic()
@@ -0,0 +1,196 @@
+# scraper_http.py
+import hashlib
+import json
+import os
+import time
+from collections import namedtuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.util.retry import Retry
+
+from atomic_files import link_atomic, replacing, write_atomic
+from settings import CACHE_DIR
+
+# Seconds to wait for a connection, and then for each read
+CONNECT_TIMEOUT = float(os.environ.get("SCRAPER_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("SCRAPER_READ_TIMEOUT", 30))
+
+# Keep-alive connections held per host, enough for every scraper worker
+POOL_SIZE = 16
+
+# Retries for failed connections and throttled or failing responses, waiting
+# RETRY_BACKOFF * 2^n seconds between them unless the server sends Retry-After
+RETRY_ATTEMPTS = 4
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Downloads are streamed to disk in chunks of this many bytes, and refused
+# beyond MAX_DOWNLOAD_BYTES
+CHUNK_SIZE = 64 * 1024
+MAX_DOWNLOAD_BYTES = 25 * 1024 * 1024
+
+# Bodies and validators of earlier responses, for conditional requests
+RESPONSE_CACHE_DIR = os.path.join(CACHE_DIR, "http")
+
+# Cached responses not stored or revalidated for this many seconds are
+# deleted when the next scrape starts
+RESPONSE_CACHE_MAX_AGE = 30 * 24 * 3600
+
+Response = namedtuple("Response", ["status_code", "content", "headers", "from_cache"])
+
+def build_session():
+    retry = Retry(
+        total=RETRY_ATTEMPTS,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+# One pooled session for every scraper thread
+session = build_session()
+
+def cache_paths(url):
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    base = os.path.join(RESPONSE_CACHE_DIR, key[:2], key)
+    return base + ".json", base + ".body"
+
+def prune_cache(max_age=RESPONSE_CACHE_MAX_AGE):
+    # Deletes cached responses, and temp files left by interrupted writes,
+    # older than max_age
+    if not os.path.isdir(RESPONSE_CACHE_DIR):
+        return
+    cutoff = time.time() - max_age
+    for shard in os.listdir(RESPONSE_CACHE_DIR):
+        shard_dir = os.path.join(RESPONSE_CACHE_DIR, shard)
+        try:
+            names = os.listdir(shard_dir)
+        except OSError:
+            continue
+        for name in names:
+            path = os.path.join(shard_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                continue
+
+def touch_cached(url):
+    # Marks a revalidated response as in use, so prune_cache keeps it
+    for path in cache_paths(url):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+def read_meta(url):
+    meta_path, _ = cache_paths(url)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def read_cached(url):
+    meta = read_meta(url)
+    if meta is None:
+        return None, None
+    _, body_path = cache_paths(url)
+    try:
+        with open(body_path, "rb") as f:
+            return meta, f.read()
+    except OSError:
+        return None, None
+
+def conditional_headers(meta):
+    # If-None-Match/If-Modified-Since from an earlier response's validators
+    headers = {}
+    if meta is not None:
+        validators = meta["validators"]
+        if "ETag" in validators:
+            headers["If-None-Match"] = validators["ETag"]
+        if "Last-Modified" in validators:
+            headers["If-Modified-Since"] = validators["Last-Modified"]
+    return headers
+
+def store_cached(url, headers, content=None, content_path=None):
+    # Keeps a response's body, given as bytes or a file (linked rather than
+    # copied), if it came with validators to revalidate it later
+    validators = {
+        header: headers[header]
+        for header in ("ETag", "Last-Modified")
+        if header in headers
+    }
+    if not validators:
+        return
+    meta_path, body_path = cache_paths(url)
+    meta = {"url": url, "validators": validators, "headers": dict(headers)}
+    try:
+        # Body first, so the metadata never points at a body that isn't there
+        if content_path is not None:
+            link_atomic(content_path, body_path)
+        else:
+            write_atomic(body_path, content)
+        write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+    except OSError as e:
+        print(f"Could not cache response for {url}: {e}")
+
+def get(url, timeout=None):
+    # GET through the pooled session. When an earlier response carried an
+    # ETag or Last-Modified it is sent back as If-None-Match/If-Modified-Since,
+    # and a 304 is answered from the local copy as a normal 200.
+    meta, cached_body = read_cached(url)
+    headers = conditional_headers(meta)
+
+    response = session.get(url, headers=headers, timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT))
+    if response.status_code == 304 and meta is not None:
+        touch_cached(url)
+        return Response(200, cached_body, CaseInsensitiveDict(meta["headers"]), True)
+    if response.status_code == 200:
+        store_cached(url, response.headers, content=response.content)
+    return Response(response.status_code, response.content, response.headers, False)
+
+def download(url, save_path, max_bytes=None, content_types=None, timeout=None):
+    # Streams url to save_path CHUNK_SIZE bytes at a time, so memory use
+    # doesn't grow with the file. The body goes to a temp file that replaces
+    # save_path only once complete. Raises ValueError if the response isn't
+    # one of content_types (prefixes such as 'image/') or is larger than
+    # max_bytes. Revalidates like get(), linking the local copy on a 304.
+    # Returns the status code, 200 when save_path was written.
+    max_bytes = max_bytes or MAX_DOWNLOAD_BYTES
+    meta = read_meta(url)
+    _, cached_body_path = cache_paths(url)
+    headers = conditional_headers(meta if meta is not None and os.path.exists(cached_body_path) else None)
+
+    with session.get(url, headers=headers, timeout=timeout or (CONNECT_TIMEOUT, READ_TIMEOUT), stream=True) as response:
+        if response.status_code == 304 and headers:
+            link_atomic(cached_body_path, save_path)
+            touch_cached(url)
+            return 200
+        if response.status_code != 200:
+            return response.status_code
+
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_types and not content_type.startswith(tuple(content_types)):
+            raise ValueError(f"unexpected content type '{content_type}'")
+        content_length = response.headers.get("Content-Length")
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise ValueError(f"{content_length} bytes is over the {max_bytes} byte limit")
+
+        size = 0
+        with replacing(save_path) as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError(f"body is over the {max_bytes} byte limit")
+                f.write(chunk)
+        store_cached(url, response.headers, content_path=save_path)
+    return 200
@@ -1,13 +1,45 @@
 import os
 import re
-import requests
-import tempfile
-from bs4 import BeautifulSoup
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin, urlparse
+from bs4 import BeautifulSoup, SoupStrainer
 import pandas as pd
-from deep_translator import GoogleTranslator
+import requests
+import scraper_http
+from scrape_jobs import ScrapeJob
+from translations import translate_terms
+
+# Requests allowed in flight at once across a whole scrape
+SCRAPE_WORKERS = 16
+
+# Requests allowed in flight at once to any single host
+PER_HOST_LIMIT = 6
+
+# Listing pages requested ahead of the one being parsed
+LISTING_PREFETCH = 3
+
+# Parser for scraped pages: lxml when it is installed, otherwise the
+# built-in html.parser. SCRAPER_HTML_PARSER picks one explicitly.
+def default_parser():
+    try:
+        import lxml  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
 
-translator = GoogleTranslator(source='cs', target='en')
-base_url = 'https://www.pohary-bauer.cz'
+HTML_PARSER = os.environ.get("SCRAPER_HTML_PARSER") or default_parser()
+
+# Only the elements the scraper reads are turned into a tree, the rest of
+# each page is skipped by the parser
+LISTING_TARGETS = SoupStrainer('div', class_="swiper-slide cell cell--product")
+GALLERY_TARGETS = SoupStrainer('a', class_='product-gallery__link nounderline')
+
+# Downloads that aren't one of these types are rejected
+IMAGE_CONTENT_TYPES = ('image/',)
+
+host_limits = {}
+host_limits_lock = threading.Lock()
 
 def extract_model_sport(text):
     terms_to_clean = [
@@ -22,95 +54,194 @@ def extract_model_sport(text):
     sport = parts[1].strip() if len(parts) > 1 else "Unknown Sport"
     return model, sport
 
+def host_limit(url):
+    # Semaphore capping the requests in flight to url's host
+    host = urlparse(url).netloc
+    with host_limits_lock:
+        if host not in host_limits:
+            host_limits[host] = threading.BoundedSemaphore(PER_HOST_LIMIT)
+        return host_limits[host]
+
+def fetch(url):
+    with host_limit(url):
+        return scraper_http.get(url)
+
+def parse_html(content, targets=None):
+    return BeautifulSoup(content, HTML_PARSER, parse_only=targets)
+
+def parse_listing(content):
+    # (model, sport, relative product page link) for each product on a
+    # listing page, None when the page has no products
+    soup = parse_html(content, LISTING_TARGETS)
+    product_divs = soup.find_all('div', class_="swiper-slide cell cell--product")
+    if not product_divs:
+        return None
+    entries = []
+    for prod_div in product_divs:
+        h3_tag = prod_div.find('h3', class_="listing-item__headline")
+        a_tag = prod_div.find('a', class_="listing-item__image")
+        if h3_tag and h3_tag.a and a_tag:
+            product_text = h3_tag.a.get_text(strip=True)
+            model, sport = extract_model_sport(product_text)
+            entries.append((model, sport, a_tag.get('href')))
+    return entries
+
+def parse_gallery_link(content):
+    # href of the main gallery image on a product page, or None
+    soup = parse_html(content, GALLERY_TARGETS)
+    img_tag = soup.find('a', class_='product-gallery__link nounderline')
+    if img_tag and img_tag.get('href'):
+        return img_tag['href']
+    return None
+
 def get_image_url(product_page_url):
     try:
-        response = requests.get(product_page_url)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        img_tag = soup.find('a', class_='product-gallery__link nounderline')
-        if img_tag and img_tag.get('href'):
-            return 'https:' + img_tag['href']
+        response = fetch(product_page_url)
+        href = parse_gallery_link(response.content)
+        if href:
+            # Gallery links are protocol-relative ('//cdn...')
+            return urljoin(product_page_url, href)
         return "Image Not Found"
     except Exception as e:
         print(f"Failed to retrieve image from {product_page_url}: {e}")
         return "Image Not Found"
 
 def download_image(image_url, save_path):
+    # Streamed straight to disk, never held in memory as a whole
     try:
-        response = requests.get(image_url)
-        if response.status_code == 200:
-            with open(save_path, 'wb') as f:
-                f.write(response.content)
+        with host_limit(image_url):
+            status_code = scraper_http.download(image_url, save_path, content_types=IMAGE_CONTENT_TYPES)
+        if status_code == 200:
             return True
         else:
-            print(f"Failed to download image: {image_url} (Status code: {response.status_code})")
+            print(f"Failed to download image: {image_url} (Status code: {status_code})")
             return False
     except Exception as e:
         print(f"Error downloading image from {image_url}: {e}")
         return False
 
+def listing_page_url(url, page):
+    if url.endswith('/'):
+        return f"{url}?strana={page}"
+    return f"{url}/?strana={page}"
+
+def scrape_listing_page(url, page):
+    # (model, sport, product page URL) for each product on one listing page,
+    # None once past the last page. Raises if the page can't be fetched, as
+    # an error page has no products either and would cut the range short.
+    page_url = listing_page_url(url, page)
+    page_response = fetch(page_url)
+    if page_response.status_code != 200:
+        raise requests.HTTPError(f"{page_response.status_code} response for {page_url}")
+    entries = parse_listing(page_response.content)
+    if entries is None:
+        return None
+    # Product links are resolved against the page they're on, as a browser would
+    return [
+        (model, sport, urljoin(page_url, product_page_relative) if product_page_relative else "")
+        for model, sport, product_page_relative in entries
+    ]
+
+def scrape_listing_page_for_job(job, url, page):
+    known, entries = job.listing_page(page)
+    if known:
+        return entries
+    entries = scrape_listing_page(url, page)
+    job.record_listing_page(page, entries)
+    return entries
+
+def scrape_product_for_job(job, model, sport, product_page_url):
+    # Reuses the product from an earlier run of the job when its image is
+    # still there, otherwise scrapes it and checkpoints the result
+    key = product_page_url or model
+    info = job.product(key)
+    if info is not None:
+        return info
+    info = scrape_product(model, sport, product_page_url, job.images_dir)
+    job.record_product(key, info)
+    return info
+
+def scrape_product(model, sport, product_page_url, temp_dir):
+    # Detail page and image download for one product
+    image_url = get_image_url(product_page_url) if product_page_url else "Image Not Found"
+    if image_url != "Image Not Found":
+        _, ext = os.path.splitext(image_url)
+        if not ext:
+            ext = ".jpg"
+        image_filename = model.replace(" ", "_") + ext
+        save_path = os.path.join(temp_dir, image_filename)
+        download_success = download_image(image_url, save_path)
+        temp_image_path = save_path if download_success else None
+    else:
+        temp_image_path = None
+    return {
+        "model": model,
+        "sport": sport,
+        "image_url": image_url,
+        "temp_image_path": temp_image_path,
+    }
+
 def scrape_product_range(url, range_name, range_code, product_category, product_material, progress_bar=None):
-    temp_dir = tempfile.mkdtemp()
-    product_info = []  # Step 1: collect basic info without downloading images.
-    page = 1
-    while True:
-        if url.endswith('/'):
-            page_url = f"{url}?strana={page}"
-        else:
-            page_url = f"{url}/?strana={page}"
-        page_response = requests.get(page_url)
-        page_soup = BeautifulSoup(page_response.content, 'html.parser')
-        product_divs = page_soup.find_all('div', class_="swiper-slide cell cell--product")
-        if not product_divs:
-            break
-        for prod_div in product_divs:
-            h3_tag = prod_div.find('h3', class_="listing-item__headline")
-            a_tag = prod_div.find('a', class_="listing-item__image")
-            if h3_tag and h3_tag.a and a_tag:
-                product_text = h3_tag.a.get_text(strip=True)
-                model, sport = extract_model_sport(product_text)
-                translated_sport = translator.translate(sport)
-                product_page_relative = a_tag.get('href')
-                product_page_url = base_url + product_page_relative if product_page_relative else ""
-                image_url = get_image_url(product_page_url) if product_page_url else "Image Not Found"
-                product_info.append({
-                    "model": model,
-                    "sport": translated_sport,
-                    "product_page_url": product_page_url,
-                    "image_url": image_url,
-                })
-        page += 1
-
-    total_products = len(product_info)
-    if progress_bar:
-        progress_bar.progress(0)
+    # Listing pages, product pages and image downloads overlap: a few listing
+    # pages are fetched ahead, and each product is handed to the pool as soon
+    # as its listing page is parsed, so product pages and images are already
+    # downloading while later listing pages are still being read.
+    # Progress is checkpointed in a job for the URL, so scraping the same
+    # URL again after an interruption skips the pages and images already done.
+    scraper_http.prune_cache()
+    job = ScrapeJob.open(url)
+    if job.resumed:
+        print(f"Resuming scrape of {url} from {job.manifest_path}")
+    product_futures = []
+    sports = []
+    try:
+        with ThreadPoolExecutor(max_workers=SCRAPE_WORKERS) as executor:
+            listing_futures = {}
+            next_page = 1
+            page = 1
+            while True:
+                while len(listing_futures) < LISTING_PREFETCH:
+                    listing_futures[next_page] = executor.submit(scrape_listing_page_for_job, job, url, next_page)
+                    next_page += 1
+                entries = listing_futures.pop(page).result()
+                if entries is None:
+                    break
+                for model, sport, product_page_url in entries:
+                    sports.append(sport)
+                    product_futures.append(executor.submit(scrape_product_for_job, job, model, sport, product_page_url))
+                page += 1
+            # Pages past the last one come back empty, don't wait on them
+            for future in listing_futures.values():
+                future.cancel()
+
+            # Each distinct sport is translated once, alongside the downloads
+            translation_future = executor.submit(translate_terms, sports)
+
+            total_products = len(product_futures)
+            if progress_bar:
+                progress_bar.progress(0)
+            for done, _ in enumerate(as_completed(product_futures), start=1):
+                if progress_bar:
+                    progress_bar.progress(done / total_products)
+    finally:
+        # Whatever finished before an interruption is kept for the next run
+        job.save()
+
+    translations = translation_future.result()
     products = []
-    for idx, info in enumerate(product_info):
-        model = info["model"]
-        translated_sport = info["sport"]
-        image_url = info["image_url"]
-        if image_url != "Image Not Found":
-            _, ext = os.path.splitext(image_url)
-            if not ext:
-                ext = ".jpg"
-            image_filename = model.replace(" ", "_") + ext
-            save_path = os.path.join(temp_dir, image_filename)
-            download_success = download_image(image_url, save_path)
-            temp_image_path = save_path if download_success else None
-        else:
-            temp_image_path = None
+    for future in product_futures:
+        info = future.result()
         product_data = {
-            "model": model,
+            "model": info["model"],
             "name": range_name,
-            "sport": translated_sport,
+            "sport": translations.get(info["sport"], info["sport"]),
             "product_code": range_code,
             "type": f"{product_category}_{product_material}",
-            "image_url": image_url,
-            "temp_image_path": temp_image_path
+            "image_url": info["image_url"],
+            "temp_image_path": info["temp_image_path"]
         }
         products.append(product_data)
-        if progress_bar:
-            progress_bar.progress((idx + 1) / total_products)
     if progress_bar:
         progress_bar.progress(1.0)
     df = pd.DataFrame(products)
-    return df, temp_dir
+    return df, job.images_dir
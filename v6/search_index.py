@@ -0,0 +1,72 @@
+# search_index.py
+import threading
+
+# Postings are kept for every substring up to this length, longer search
+# terms are looked up through their n-grams and then checked directly
+GRAM_SIZE = 3
+
+class SearchIndex:
+    """Lowercase n-gram postings over catalog text columns for substring search."""
+
+    def __init__(self, df, fields=('product name', 'code')):
+        self.size = len(df)
+        # Only real strings can match, same as str.contains(na=False)
+        self.texts = {
+            field: [value.lower() if isinstance(value, str) else None for value in df[field]]
+            for field in fields
+        }
+        # Postings are built on the first search so loading the catalog
+        # isn't held up by it
+        self.postings = None
+        self.lock = threading.Lock()
+
+    def _build(self):
+        postings = {}
+        for field, texts in self.texts.items():
+            field_postings = postings[field] = {}
+            for position, text in enumerate(texts):
+                if not text:
+                    continue
+                grams = {
+                    text[start:start + length]
+                    for length in range(1, GRAM_SIZE + 1)
+                    for start in range(len(text) - length + 1)
+                }
+                for gram in grams:
+                    field_postings.setdefault(gram, set()).add(position)
+        return postings
+
+    def _matches(self, field, term):
+        # Row positions whose field contains term
+        texts, postings = self.texts[field], self.postings[field]
+        if len(term) <= GRAM_SIZE:
+            return postings.get(term, set())
+
+        grams = sorted(
+            (postings.get(term[start:start + GRAM_SIZE], set()) for start in range(len(term) - GRAM_SIZE + 1)),
+            key=len
+        )
+        candidates = set.intersection(*grams)
+        return {position for position in candidates if term in texts[position]}
+
+    def search(self, query):
+        # Sorted row positions where every term is in the name, or every term
+        # is in the code
+        terms = query.lower().split()
+        if not terms:
+            return list(range(self.size))
+
+        with self.lock:
+            if self.postings is None:
+                self.postings = self._build()
+
+        result = set()
+        for field in self.texts:
+            matches = None
+            for term in terms:
+                term_matches = self._matches(field, term)
+                matches = term_matches if matches is None else matches & term_matches
+                if not matches:
+                    break
+            result |= matches
+        return sorted(result)
@@ -0,0 +1,9 @@
+# settings.py
+import os
+
+# Local working directory for snapshots and caches, kept next to the app
+# unless TROPHY_CACHE_DIR points somewhere else
+CACHE_DIR = os.environ.get(
+    "TROPHY_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+)
@@ -0,0 +1,54 @@
+-- sql/catalog_updated_at.sql
+--
+-- Adds the updated_at column the catalog sync in utils.py reads as its
+-- high-water mark (utils.SYNC_COLUMN) to every product table, its _sizes
+-- table and metal_cups, with a trigger that stamps it on every update and
+-- an index for the "updated_at > mark" filter. Run it once in the Supabase
+-- SQL editor; running it again is harmless. Tables without the column are
+-- re-read in full on every sync, so add any new product table to the list
+-- below and run it again.
+--
+-- Deleted rows leave no trace here; each sync also reads the key column of
+-- every table and drops the rows that are gone.
+
+create or replace function set_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+  new.updated_at := now();
+  return new;
+end;
+$$;
+
+do $$
+declare
+  catalog_table text;
+begin
+  foreach catalog_table in array array[
+    'trophies_acrylic', 'trophies_acrylic_sizes',
+    'trophies_wood', 'trophies_wood_sizes',
+    'trophies_glass', 'trophies_glass_sizes',
+    'trophies_metal', 'trophies_metal_sizes',
+    'medals_acrylic', 'medals_acrylic_sizes',
+    'medals_wood', 'medals_wood_sizes',
+    'medals_metal', 'medals_metal_sizes',
+    'metal_cups'
+  ] loop
+    if to_regclass(format('public.%I', catalog_table)) is null then
+      raise notice 'skipping %, no such table', catalog_table;
+      continue;
+    end if;
+    execute format(
+      'alter table public.%I add column if not exists updated_at timestamptz not null default now()',
+      catalog_table);
+    execute format('create index if not exists %I on public.%I (updated_at)',
+      catalog_table || '_updated_at', catalog_table);
+    execute format('drop trigger if exists set_updated_at on public.%I', catalog_table);
+    execute format(
+      'create trigger set_updated_at before update on public.%I '
+      'for each row execute function set_updated_at()',
+      catalog_table);
+  end loop;
+end;
+$$;
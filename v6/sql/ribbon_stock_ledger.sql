@@ -0,0 +1,190 @@
+-- sql/ribbon_stock_ledger.sql
+--
+-- Append-only ledger of ribbon stock movements, and the function the
+-- Ribbon Tracker applies uploaded PDFs through (backend.apply_ribbon_documents
+-- calls it as supabase.rpc('apply_ribbon_documents', ...)). Run it once in
+-- the Supabase SQL editor.
+--
+-- Every applied PDF gets a row in ribbon_stock_documents keyed by the sha256
+-- of its bytes, so applying the same PDF again is turned away by a primary
+-- key lookup. Its movements are kept per order ID and colour, each with the
+-- colour's running total after it. An Amazon order's colour is only ever
+-- taken off once, so a packing slip downloaded again (different bytes, same
+-- orders) doesn't count it twice; supplier invoices (no order ID) and items
+-- whose order ID couldn't be read ('UNKNOWN') aren't checked this way.
+-- ribbons.quantity stays the materialised current total, changed in the
+-- same transaction as the ledger rows.
+--
+-- The ledger tables have row level security on and no policies, and the
+-- API roles get no privileges on them, so nothing can be written to them
+-- through the API except by apply_ribbon_documents. That function runs as
+-- its owner and can only be executed by the authenticated and service_role
+-- roles; if the app's SUPABASE_KEY is the anon key, grant it to anon too
+-- (that key can already change ribbons directly).
+
+create table if not exists ribbon_stock_documents (
+  document_hash text primary key,
+  name text,
+  applied_at timestamptz not null default now()
+);
+
+create table if not exists ribbon_stock_movements (
+  id bigint generated always as identity primary key,
+  document_hash text not null references ribbon_stock_documents (document_hash),
+  order_id text not null default '',
+  colour text not null,
+  -- Change asked for, and change made once the total is clamped at zero
+  delta integer not null,
+  applied integer not null,
+  quantity_after integer not null,
+  created_at timestamptz not null default now(),
+  unique (document_hash, order_id, colour)
+);
+
+create index if not exists ribbon_stock_movements_colour
+  on ribbon_stock_movements (colour, id);
+
+create unique index if not exists ribbon_stock_movements_order
+  on ribbon_stock_movements (order_id, colour)
+  where order_id not in ('', 'UNKNOWN');
+
+alter table ribbon_stock_documents enable row level security;
+alter table ribbon_stock_movements enable row level security;
+revoke all on ribbon_stock_documents, ribbon_stock_movements from anon, authenticated;
+
+-- The ledger is only ever added to
+create or replace function reject_ribbon_ledger_change()
+returns trigger
+language plpgsql
+as $$
+begin
+  raise exception 'the ribbon stock ledger is append-only';
+end;
+$$;
+
+drop trigger if exists ribbon_stock_documents_append_only on ribbon_stock_documents;
+create trigger ribbon_stock_documents_append_only
+  before update or delete on ribbon_stock_documents
+  for each row execute function reject_ribbon_ledger_change();
+
+drop trigger if exists ribbon_stock_movements_append_only on ribbon_stock_movements;
+create trigger ribbon_stock_movements_append_only
+  before update or delete on ribbon_stock_movements
+  for each row execute function reject_ribbon_ledger_change();
+
+-- documents is a JSON array of
+--   {"document_hash": text, "name": text,
+--    "movements": [{"order_id": text, "colour": text, "delta": integer}]}
+--
+-- Documents already in the ledger are skipped whole. The movements of the
+-- rest are summed per document, order ID and colour and applied in one
+-- transaction, with the ribbons rows locked in colour order. Colours with
+-- no ribbons row are left out, as are order IDs and colours already in the
+-- ledger from another document (or earlier in the same batch). Returns
+--   {"duplicates": [document_hash],
+--    "applied_orders": [{"document_hash", "order_id", "colour"}],
+--    "stock": [{"colour", "before_quantity", "after_quantity"}]}
+create or replace function apply_ribbon_documents(documents jsonb)
+returns jsonb
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  new_hashes text[];
+  duplicates jsonb;
+  applied_orders jsonb := '[]'::jsonb;
+  pending jsonb;
+  before_stock jsonb;
+  movement record;
+  current_quantity integer;
+  new_quantity integer;
+  stock jsonb;
+begin
+  with requested as (
+    select distinct on (doc ->> 'document_hash')
+      doc ->> 'document_hash' as document_hash,
+      doc ->> 'name' as name
+    from jsonb_array_elements(documents) as doc
+  ),
+  inserted as (
+    insert into ribbon_stock_documents (document_hash, name)
+    select document_hash, name from requested
+    on conflict (document_hash) do nothing
+    returning document_hash
+  )
+  select coalesce(array_agg(document_hash), '{}') into new_hashes from inserted;
+
+  select coalesce(jsonb_agg(distinct doc ->> 'document_hash'), '[]'::jsonb) into duplicates
+  from jsonb_array_elements(documents) as doc
+  where not (doc ->> 'document_hash' = any(new_hashes));
+
+  select coalesce(jsonb_agg(m order by m.colour, m.document_hash, m.order_id), '[]'::jsonb) into pending
+  from (
+    select
+      doc.document_hash,
+      coalesce(mv.order_id, '') as order_id,
+      mv.colour,
+      sum(mv.delta)::integer as delta
+    from (
+      select distinct on (value ->> 'document_hash')
+        value ->> 'document_hash' as document_hash,
+        value -> 'movements' as movements
+      from jsonb_array_elements(documents)
+    ) as doc
+    cross join jsonb_to_recordset(doc.movements) as mv(order_id text, colour text, delta integer)
+    where doc.document_hash = any(new_hashes)
+    group by 1, 2, 3
+  ) as m;
+
+  -- Locked in a fixed order so two batches can't deadlock
+  select coalesce(jsonb_object_agg(locked.colour, locked.quantity), '{}'::jsonb) into before_stock
+  from (
+    select r.colour, r.quantity
+    from ribbons r
+    where r.colour in (select p.colour from jsonb_to_recordset(pending) as p(colour text))
+    order by r.colour
+    for update
+  ) as locked;
+
+  for movement in
+    select * from jsonb_to_recordset(pending) as p(document_hash text, order_id text, colour text, delta integer)
+  loop
+    select r.quantity into current_quantity from ribbons r where r.colour = movement.colour;
+    if not found then
+      continue;
+    end if;
+    -- A batch changing the same colour waits above on its ribbons row until
+    -- this one commits, so it sees these rows here
+    if movement.order_id not in ('', 'UNKNOWN') and exists (
+      select 1 from ribbon_stock_movements m
+      where m.order_id = movement.order_id and m.colour = movement.colour
+    ) then
+      applied_orders := applied_orders || jsonb_build_object(
+        'document_hash', movement.document_hash,
+        'order_id', movement.order_id,
+        'colour', movement.colour
+      );
+      continue;
+    end if;
+    new_quantity := greatest(current_quantity + movement.delta, 0);
+    update ribbons set quantity = new_quantity where ribbons.colour = movement.colour;
+    insert into ribbon_stock_movements (document_hash, order_id, colour, delta, applied, quantity_after)
+    values (movement.document_hash, movement.order_id, movement.colour, movement.delta,
+            new_quantity - current_quantity, new_quantity);
+  end loop;
+
+  select coalesce(jsonb_agg(jsonb_build_object(
+      'colour', r.colour,
+      'before_quantity', (before_stock ->> r.colour)::integer,
+      'after_quantity', r.quantity
+    ) order by r.colour), '[]'::jsonb) into stock
+  from ribbons r
+  where before_stock ? r.colour;
+
+  return jsonb_build_object('duplicates', duplicates, 'applied_orders', applied_orders, 'stock', stock);
+end;
+$$;
+
+revoke all on function apply_ribbon_documents(jsonb) from public, anon;
+grant execute on function apply_ribbon_documents(jsonb) to authenticated, service_role;
@@ -0,0 +1,138 @@
+# transforms.py
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+from images import THUMB_PREFIX
+
+# Turns raw Supabase rows into the catalog frame the pages use. Everything
+# here works on whole columns; the only Python loops are one per model when
+# the sizes lists are assembled.
+
+def group_sizes(sizes_df, column, models):
+    # List of the non-null values of column for each model, in sizes table
+    # order, from one stable sort of the sizes table. Models without any
+    # get an empty list.
+    present = sizes_df[sizes_df[column].notna()]
+    ordered = present.sort_values('model', kind='stable')
+    keys = ordered['model'].to_numpy()
+    values = ordered[column].tolist()
+
+    starts = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    bounds = [0, *starts.tolist(), len(keys)]
+    lists = {keys[start]: values[start:end] for start, end in zip(bounds, bounds[1:]) if end > start}
+
+    grouped = models.map(lists)
+    missing = grouped.isna()
+    if missing.any():
+        grouped[missing] = pd.Series([[] for _ in range(missing.sum())], index=grouped.index[missing], dtype=object)
+    return grouped
+
+def thumbnail_urls(models, image_urls, base_url, thumbs):
+    # URL of each model's thumbnail where thumbs (the file names under
+    # THUMB_PREFIX in the table's bucket) has one, else its full image, so
+    # images uploaded before thumbnails existed still show until backfilled
+    file_names = models.str.replace(" ", "_") + '.webp'
+    has_thumb = file_names.isin(thumbs or ())
+    return (base_url + THUMB_PREFIX + file_names).where(has_thumb, image_urls)
+
+def build_table_frame(prod_df, sizes_df, base_url, thumbs=None):
+    df = prod_df.copy()
+
+    # Attach sizes and size_codes
+    df['size'] = group_sizes(sizes_df, 'size', df['model'])
+    df['size_code'] = group_sizes(sizes_df, 'size_code', df['model'])
+
+    # Construct image URL
+    df['model_code_clean'] = df['model'].str.replace(" ", "_")
+    df['image url'] = base_url + df['model_code_clean'] + '.jpg'
+    df['thumbnail url'] = thumbnail_urls(df['model'], df['image url'], base_url, thumbs)
+
+    # Construct product name, left empty for products without a name
+    product_name = df['name'].astype(str) + ' ' + df['sport'].astype(str) + ' ' + df['type'].astype(str)
+    df['product name'] = product_name.where(df['name'].astype(bool), None)
+
+    # Assign 'range'
+    df['range'] = df['name']
+
+    # Select and rename columns for consistency
+    df = df[['product name', 'model', 'image url', 'thumbnail url', 'size', 'size_code', 'product_code', 'range', 'sport']]
+    df = df.rename(columns={
+        'model': 'code',
+        'size': 'sizes',
+        'size_code': 'size_codes'
+    })
+    return df
+
+def build_metal_cups_frame(metal_cups_df):
+    # Verify that required columns exist
+    required_columns = {'name', 'colour', 'code', 'image_url', 'sizes'}
+    if not required_columns.issubset(metal_cups_df.columns):
+        st.error(f"Missing columns in metal_cups table. Required columns: {required_columns}")
+        return None
+
+    metal_cups_df = metal_cups_df.copy()
+
+    # Construct 'product name' as "name + colour + Metal Cup"
+    metal_cups_df['product name'] = metal_cups_df['name'].astype(str) + ' ' + metal_cups_df['colour'].astype(str) + ' Metal Cup'
+
+    # Assign 'image url' directly from 'image_url' column
+    metal_cups_df['image url'] = metal_cups_df['image_url']
+
+    # Metal cup images aren't ours to resize, the list shows them as they are
+    metal_cups_df['thumbnail url'] = metal_cups_df['image_url']
+
+    # 'sizes' are already present; since there are no size codes, set 'size_codes' same as 'sizes'
+    metal_cups_df['size_codes'] = metal_cups_df['sizes']
+
+    # Assign 'product code' as 'code'
+    metal_cups_df['product_code'] = metal_cups_df['code']
+
+    # Fill in other required columns with placeholders or appropriate values
+    metal_cups_df['range'] = metal_cups_df['name']
+    metal_cups_df['sport'] = None  # Assuming 'metal_cups' don't have a 'sport' category
+
+    # Select and reorder columns to match the standard format
+    metal_cups_df = metal_cups_df[[
+        'product name',
+        'code',
+        'image url',
+        'thumbnail url',
+        'sizes',
+        'size_codes',
+        'product_code',
+        'range',
+        'sport'
+    ]]
+    return metal_cups_df
+
+def to_arrow_lists(column):
+    # Stores a column of Python lists as one Arrow list array (flat offsets
+    # plus values). Mixed element types are stored as strings; anything that
+    # still won't convert is left as it is.
+    try:
+        array = pa.array(column, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        try:
+            array = pa.array(
+                [[str(value) for value in values] if pd.api.types.is_list_like(values) else None for values in column],
+                type=pa.list_(pa.string())
+            )
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return column
+    if not pa.types.is_list(array.type):
+        return column
+    return pd.Series(pd.array(array, dtype=pd.ArrowDtype(array.type)), index=column.index)
+
+def compact_frame(df):
+    # Compact form of the combined catalog that is shared, read-only, by
+    # every session: categoricals for the low-cardinality columns, Arrow
+    # strings for the rest and Arrow lists for sizes and size codes
+    df = df.copy()
+    for column in ('range', 'sport', 'product code'):
+        df[column] = df[column].astype('category')
+    for column in ('product name', 'code', 'image url', 'thumbnail url'):
+        df[column] = df[column].astype('string[pyarrow]')
+    for column in ('sizes', 'size_codes'):
+        df[column] = to_arrow_lists(df[column])
+    return df
@@ -0,0 +1,141 @@
+# translations.py
+import csv
+import os
+import sqlite3
+from contextlib import contextmanager
+
+from deep_translator import GoogleTranslator
+
+from settings import CACHE_DIR
+
+SOURCE_LANGUAGE = 'cs'
+TARGET_LANGUAGE = 'en'
+
+# Every translation fetched so far, plus overrides and seeded terms
+TRANSLATION_DB = os.path.join(CACHE_DIR, "translations.sqlite")
+
+# Known terms loaded into the cache before anything is looked up online,
+# one "source,translation" pair per line. They replace translations fetched
+# online, so correcting a term here fixes it; overrides win over both.
+SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sport_translations.csv")
+
+# With TRANSLATION_OFFLINE set, terms missing from the cache are left as they are
+OFFLINE = os.environ.get("TRANSLATION_OFFLINE", "").lower() in ("1", "true", "yes")
+
+# Google accepts up to 5000 characters per request, unique terms are sent
+# together one per line in chunks below that
+BATCH_CHARS = 4500
+
+translator = GoogleTranslator(source=SOURCE_LANGUAGE, target=TARGET_LANGUAGE)
+
+@contextmanager
+def connect():
+    # Connection to the cache, committed and closed on exit
+    os.makedirs(os.path.dirname(TRANSLATION_DB), exist_ok=True)
+    connection = sqlite3.connect(TRANSLATION_DB, timeout=30)
+    try:
+        with connection:
+            connection.execute(
+                """CREATE TABLE IF NOT EXISTS translations (
+                    source TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    translation TEXT NOT NULL,
+                    override INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (source, target, text)
+                )"""
+            )
+            yield connection
+    finally:
+        connection.close()
+
+def seed_cache(path=SEED_FILE):
+    # Adds the terms from a dictionary file, replacing cached translations of
+    # them unless they're overrides. Returns the rows added or changed.
+    if not os.path.exists(path):
+        return 0
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = [
+            (SOURCE_LANGUAGE, TARGET_LANGUAGE, row[0].strip(), row[1].strip())
+            for row in csv.reader(f)
+            if len(row) >= 2 and row[0].strip() and not row[0].startswith('#')
+        ]
+    with connect() as connection:
+        cursor = connection.executemany(
+            """INSERT INTO translations (source, target, text, translation) VALUES (?, ?, ?, ?)
+               ON CONFLICT (source, target, text) DO UPDATE SET translation = excluded.translation
+               WHERE override = 0 AND translation != excluded.translation""",
+            rows
+        )
+        return cursor.rowcount
+
+def set_override(text, translation):
+    # Pins a translation, it is never replaced by an online lookup
+    with connect() as connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO translations (source, target, text, translation, override) VALUES (?, ?, ?, ?, 1)",
+            (SOURCE_LANGUAGE, TARGET_LANGUAGE, text, translation)
+        )
+
+def cached_translations(connection, texts):
+    found = {}
+    texts = list(texts)
+    for start in range(0, len(texts), 500):
+        chunk = texts[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        rows = connection.execute(
+            f"SELECT text, translation FROM translations WHERE source = ? AND target = ? AND text IN ({placeholders})",
+            (SOURCE_LANGUAGE, TARGET_LANGUAGE, *chunk)
+        )
+        found.update(rows)
+    return found
+
+def chunk_terms(terms):
+    chunk, size = [], 0
+    for term in terms:
+        if chunk and size + len(term) + 1 > BATCH_CHARS:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(term)
+        size += len(term) + 1
+    if chunk:
+        yield chunk
+
+def translate_online(terms):
+    # One request per chunk of terms joined by newlines. If the lines don't
+    # come back one for one, that chunk is translated term by term instead.
+    translated = {}
+    for chunk in chunk_terms(terms):
+        result = translator.translate("\n".join(chunk))
+        lines = result.split("\n") if result else []
+        if len(lines) != len(chunk):
+            lines = translator.translate_batch(chunk)
+        translated.update((term, line.strip()) for term, line in zip(chunk, lines) if line and line.strip())
+    return translated
+
+def translate_terms(texts, offline=None):
+    # Translation of every distinct text: from the cache where possible, the
+    # rest in one batch, which is then cached. Offline, or if the online
+    # lookup fails, uncached texts map to themselves and aren't stored.
+    offline = OFFLINE if offline is None else offline
+    unique = list(dict.fromkeys(text for text in texts if text))
+
+    seed_cache()
+    with connect() as connection:
+        translations = cached_translations(connection, unique)
+        missing = [text for text in unique if text not in translations]
+        if missing and not offline:
+            try:
+                fetched = translate_online(missing)
+            except Exception as e:
+                print(f"Translation failed for {len(missing)} terms: {e}")
+                fetched = {}
+            connection.executemany(
+                "INSERT OR IGNORE INTO translations (source, target, text, translation) VALUES (?, ?, ?, ?)",
+                [(SOURCE_LANGUAGE, TARGET_LANGUAGE, text, translation) for text, translation in fetched.items()]
+            )
+            translations.update(fetched)
+
+    for text in unique:
+        translations.setdefault(text, text)
+    return translations
@@ -0,0 +1,57 @@
+# upload_manifest.py
+import json
+import os
+import threading
+
+from atomic_files import write_atomic
+from settings import CACHE_DIR
+
+# One file per bucket mapping each uploaded image path to its sha256
+MANIFEST_DIR = os.path.join(CACHE_DIR, "upload_manifests")
+
+class UploadManifest:
+    """sha256 of every image uploaded to a bucket from here, so unchanged
+    images aren't sent again and identical ones can be copied server-side
+    from the first path they were stored under."""
+
+    def __init__(self, bucket_name):
+        self.bucket_name = bucket_name
+        self.path = os.path.join(MANIFEST_DIR, f"{bucket_name}.json")
+        self.lock = threading.Lock()
+        self.hashes = self._load()
+        self.paths_by_hash = {}
+        for path, digest in self.hashes.items():
+            self.paths_by_hash.setdefault(digest, set()).add(path)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def unchanged(self, path, digest):
+        with self.lock:
+            return self.hashes.get(path) == digest
+
+    def stored_copy(self, digest, exclude=()):
+        # A path already holding these bytes, other than those in exclude
+        # (ones about to be overwritten), or None
+        with self.lock:
+            paths = self.paths_by_hash.get(digest, set()) - set(exclude)
+            return min(paths) if paths else None
+
+    def record(self, path, digest):
+        with self.lock:
+            previous = self.hashes.get(path)
+            if previous is not None and previous != digest:
+                self.paths_by_hash[previous].discard(path)
+                if not self.paths_by_hash[previous]:
+                    del self.paths_by_hash[previous]
+            self.hashes[path] = digest
+            self.paths_by_hash.setdefault(digest, set()).add(path)
+
+    def save(self):
+        with self.lock:
+            data = json.dumps(self.hashes, sort_keys=True).encode('utf-8')
+        write_atomic(self.path, data)
@@ -1,11 +1,20 @@
 # utils.py
+import os
+import time
+import collections
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import streamlit as st
 import pandas as pd
-from st_supabase_connection import SupabaseConnection, execute_query
+import pyarrow as pa
 
-# Initialize Supabase connection
-supabase = st.connection("supabase", type=SupabaseConnection)
-supabase_url = st.secrets["connections"]["supabase"]["SUPABASE_URL"]
+from atomic_files import replacing
+from backend import list_bucket_files
+from db import supabase, supabase_url
+from images import THUMB_PREFIX
+from search_index import SearchIndex
+from settings import CACHE_DIR
+from transforms import build_table_frame, build_metal_cups_frame, compact_frame, thumbnail_urls
 
 # Mapping from singular to plural for categories
 singular_to_plural = {
@@ -14,109 +23,436 @@ singular_to_plural = {
     'cup': 'cups'  # Added for consistency
 }
 
-@st.cache_data(ttl=1200)
-def load_data(materials_dict):
-    data_frames = []
-
-    # Process standard product tables (e.g., trophies_acrylic, medals_wood, etc.)
-    for category, materials in materials_dict.items():
-        for material in materials:
-            table = f'{category}_{material}'
-            size_table = f'{table}_sizes'
-
-            # Fetch data from Supabase
-            response = execute_query(supabase.table(table).select("*"), ttl=0)
-            size_response = execute_query(supabase.table(size_table).select("*"), ttl=0)
-
-            # Base URL for image storage
-            base_url = f"{supabase_url}/storage/v1/object/public/{table}/"
-
-            # Check if both responses have data
-            if hasattr(response, 'data') and hasattr(size_response, 'data'):
-                data = response.data
-                size_data = size_response.data
-                if data and size_data:
-                    prod_df = pd.DataFrame(data)
-                    sizes_df = pd.DataFrame(size_data)
-
-                    # Merge product and size data
-                    ungrouped_df = pd.merge(prod_df, sizes_df, on='model', how='left')
-                    grouped = ungrouped_df.groupby('model').agg({
-                        'size': lambda x: list(x.dropna()),
-                        'size_code': lambda x: list(x.dropna())
-                    }).reset_index()
-
-                    # Merge back to get sizes and size_codes
-                    df = pd.merge(prod_df, grouped, on='model', how='left')
-
-                    # Construct image URL
-                    df['model_code_clean'] = df['model'].str.replace(" ", "_")
-                    df['image url'] = base_url + df['model_code_clean'] + '.jpg'
-
-                    # Construct product name
-                    df['product name'] = df.apply(
-                        lambda row: f"{row['name']} {row['sport']} {row['type']}" if row['name'] else None, axis=1
-                    )
-
-                    # Assign 'range'
-                    df['range'] = df['name']
-
-                    # Select and rename columns for consistency
-                    df = df[['product name', 'model', 'image url', 'size', 'size_code', 'product_code', 'range', 'sport']]
-                    df.rename(columns={
-                        'model': 'code',
-                        'size': 'sizes',
-                        'size_code': 'size_codes'
-                    }, inplace=True)
-
-                    # Append to the list of DataFrames
-                    data_frames.append(df)
-
-    # Process the new 'metal_cups' table separately
-    metal_cups_response = execute_query(supabase.table("metal_cups").select("*"), ttl=0)
-    if hasattr(metal_cups_response, 'data') and metal_cups_response.data:
-        metal_cups_data = metal_cups_response.data
-        metal_cups_df = pd.DataFrame(metal_cups_data)
-
-        # Verify that required columns exist
-        required_columns = {'name', 'colour', 'code', 'image_url', 'sizes'}
-        if not required_columns.issubset(metal_cups_df.columns):
-            st.error(f"Missing columns in metal_cups table. Required columns: {required_columns}")
-            return pd.DataFrame()
-
-        # Construct 'product name' as "name + colour + Metal Cup"
-        metal_cups_df['product name'] = metal_cups_df.apply(
-            lambda row: f"{row['name']} {row['colour']} Metal Cup", axis=1
-        )
-
-        # Assign 'image url' directly from 'image_url' column
-        metal_cups_df['image url'] = metal_cups_df['image_url']
-
-        # 'sizes' are already present; since there are no size codes, set 'size_codes' same as 'sizes'
-        metal_cups_df['size_codes'] = metal_cups_df['sizes']
-
-        # Assign 'product code' as 'code'
-        metal_cups_df['product_code'] = metal_cups_df['code']
-
-        # Fill in other required columns with placeholders or appropriate values
-        metal_cups_df['range'] = metal_cups_df['name']
-        metal_cups_df['sport'] = None  # Assuming 'metal_cups' don't have a 'sport' category
-
-        # Select and reorder columns to match the standard format
-        metal_cups_df = metal_cups_df[[
-            'product name',
-            'code',
-            'image url',
-            'sizes',
-            'size_codes',
-            'product_code',
-            'range',
-            'sport'
-        ]]
-
-        # Append to the list of DataFrames
-        data_frames.append(metal_cups_df)
+# Number of table reads allowed in flight at once when loading the catalog
+LOAD_WORKERS = 8
 
+# Rows requested per page. PostgREST silently truncates larger responses at
+# its max-rows setting (1000 on Supabase by default)
+PAGE_SIZE = 1000
+
+# Number of pages of a single table allowed in flight at once
+PAGE_WORKERS = 4
+
+# Values per request when reading rows by key with an in.(...) filter
+IN_BATCH_SIZE = 100
+
+# Seconds before load_data checks Supabase for catalog changes
+CATALOG_TTL = 1200
+
+# Arrow IPC snapshot of the catalog, one file per source table, used to serve
+# the first page of a new process without waiting on Supabase
+SNAPSHOT_DIR = os.path.join(CACHE_DIR, "catalog")
+
+# Column used as the high-water mark for incremental syncs. Tables without it
+# are re-read in full on every sync.
+SYNC_COLUMN = 'updated_at'
+
+# Rows stamped up to this long before the high-water mark are read again on
+# every sync. updated_at is set when a transaction writes a row, so a row
+# from a transaction that commits after a later-stamped row was synced would
+# otherwise be missed; patching a row in again changes nothing.
+SYNC_OVERLAP = pd.Timedelta(seconds=5)
+
+def fetch_pages(table, order_by, page_size=PAGE_SIZE, where=None, columns="*"):
+    # Yields a whole table as DataFrame chunks, in order. The first page also
+    # asks for the exact row count, after which the remaining pages are
+    # requested concurrently, a few at a time so memory stays bounded.
+    # order_by must be a stable (ideally unique) key or pages can overlap.
+    # where, if given, adds filters to every page query.
+    def fetch_page(start, end, count=None):
+        query = supabase.table(table).select(columns, count=count)
+        if where:
+            query = where(query)
+        query = query.order(order_by).range(start, end)
+        return query.execute()
+
+    first = fetch_page(0, page_size - 1, count="exact")
+    if not first.data:
+        return
+    yield pd.DataFrame(first.data)
+
+    # Step by what actually came back in case the server caps pages lower
+    step = len(first.data)
+    total = first.count or 0
+    starts = range(step, total, step)
+    if not starts:
+        return
+
+    with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as executor:
+        pending = collections.deque()
+        for start in starts:
+            pending.append(executor.submit(fetch_page, start, start + step - 1))
+            if len(pending) >= PAGE_WORKERS:
+                data = pending.popleft().result().data
+                if data:
+                    yield pd.DataFrame(data)
+        while pending:
+            data = pending.popleft().result().data
+            if data:
+                yield pd.DataFrame(data)
+
+def read_table(table, order_by, where=None, columns="*"):
+    # Full-table read that is not cut off at the PostgREST row cap
+    chunks = list(fetch_pages(table, order_by, where=where, columns=columns))
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True)
+
+# Stable keys used to page through the catalog tables
+def order_key(table):
+    if table == "metal_cups":
+        return "code"
+    if table.endswith("_sizes"):
+        return "size_code"
+    return "model"
+
+def fetch_table(table):
+    # Runs on a worker thread
+    start = time.perf_counter()
+    df = read_table(table, order_key(table))
+    return df, time.perf_counter() - start
+
+def read_rows(table, column, values):
+    # Rows whose column is one of values, in batches to keep URLs short
+    values = sorted(values)
+    chunks = []
+    for i in range(0, len(values), IN_BATCH_SIZE):
+        batch = values[i:i + IN_BATCH_SIZE]
+        chunk = read_table(table, order_key(table), where=lambda query: query.in_(column, batch))
+        if not chunk.empty:
+            chunks.append(chunk)
+    if not chunks:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True)
+
+def fetch_thumbs(table):
+    # Runs on a worker thread. File names of the thumbnails in the table's
+    # bucket, or None if they couldn't be listed
+    try:
+        return set(list_bucket_files(table, THUMB_PREFIX.rstrip('/')))
+    except Exception as e:
+        print(f"Could not list thumbnails for '{table}': {e}")
+        return None
+
+def read_keys(table):
+    # Every value of the table's order key, reading only that column
+    key = order_key(table)
+    return set(read_table(table, key, columns=key).get(key, []))
+
+def fetch_changes(table, mark, frame):
+    # Runs on a worker thread. Reads only the rows changed after the
+    # high-water mark (less SYNC_OVERLAP), then the complete product and
+    # size rows of every model they touch so its sizes list can be rebuilt,
+    # and lists the bucket's thumbnails again for ones made since. Deletes
+    # leave no updated_at behind, so the keys still in the tables are read
+    # as well: codes of frame that are gone are returned to be dropped, and
+    # models that lost a size are read again.
+    start = time.perf_counter()
+    changed_since = lambda query: query.gt(SYNC_COLUMN, (mark - SYNC_OVERLAP).isoformat())
+    codes = set() if frame is None else set(frame['code'])
+    if table == "metal_cups":
+        changes = (read_table(table, order_key(table), where=changed_since),)
+        removed = codes - read_keys(table)
+    else:
+        sizes_table = f'{table}_sizes'
+        changed = read_table(table, order_key(table), where=changed_since)
+        changed_sizes = read_table(sizes_table, order_key(sizes_table), where=changed_since)
+        removed = codes - read_keys(table)
+        size_codes = read_keys(sizes_table)
+        lost_sizes = set() if frame is None else {
+            code for code, frame_size_codes in zip(frame['code'], frame['size_codes'])
+            if code not in removed and any(size_code not in size_codes for size_code in frame_size_codes)
+        }
+        models = set(changed.get('model', [])) | set(changed_sizes.get('model', [])) | lost_sizes
+        if models:
+            changes = (read_rows(table, 'model', models), read_rows(sizes_table, 'model', models))
+        else:
+            changes = (pd.DataFrame(), pd.DataFrame())
+        changes += (fetch_thumbs(table),)
+    return changes, removed, time.perf_counter() - start
+
+def high_water_mark(*dfs):
+    # Latest SYNC_COLUMN value across the frames, or None if any lacks it
+    if any(SYNC_COLUMN not in df.columns for df in dfs):
+        return None
+    stamps = pd.to_datetime(pd.concat([df[SYNC_COLUMN] for df in dfs]), utc=True, errors='coerce').dropna()
+    if stamps.empty:
+        return None
+    return stamps.max()
+
+def patch_frame(frame, changes, key):
+    # Replaces the rows of frame found in changes, keeping their position,
+    # and appends the rows that are new
+    if frame is None:
+        return changes.reset_index(drop=True)
+    position = {value: i for i, value in enumerate(frame[key])}
+    kept = frame[~frame[key].isin(changes[key])]
+    combined = pd.concat([kept, changes], ignore_index=True)
+    order = [position.get(value, len(position) + i) for i, value in enumerate(combined[key])]
+    return combined.iloc[sorted(range(len(order)), key=order.__getitem__)].reset_index(drop=True)
+
+@st.cache_resource
+def catalog_store():
+    # Process-wide catalog shared by every session. 'frames' holds the built
+    # frame of each source table (None when it had no data), 'marks' the
+    # latest SYNC_COLUMN value seen in it (None if it has no such column, in
+    # which case it is always re-read in full) and 'synced_at' when it was
+    # last brought up to date. 'restored' is set once the on-disk snapshot
+    # has been read. 'combined' caches the combined frame and search index
+    # for each set of source tables asked for.
+    return {'lock': threading.Lock(), 'frames': {}, 'marks': {}, 'synced_at': {}, 'restored': False, 'combined': {}}
+
+def image_base_url(table):
+    # Base URL for image storage
+    return f"{supabase_url}/storage/v1/object/public/{table}/"
+
+def load_sources(store, sources):
+    # Full read of each source. Every product table (e.g. trophies_acrylic,
+    # medals_wood), its sizes table and metal_cups are requested at once, so a
+    # cold load costs roughly as much as the slowest single query rather than
+    # the sum of all of them. A table whose read fails keeps its current frame
+    # and mark; the tables that failed are returned.
+    names = [name for table in sources
+             for name in ((table,) if table == "metal_cups" else (table, f'{table}_sizes'))]
+    responses = {}
+    timings = {}
+    failed = set()
+    with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+        futures = {executor.submit(fetch_table, name): name for name in names}
+        thumbs = {table: executor.submit(fetch_thumbs, table) for table in sources if table != "metal_cups"}
+
+        # Build each frame as soon as all of its reads have arrived
+        for future in as_completed(futures):
+            name = futures[future]
+            table = name[:-len('_sizes')] if name.endswith('_sizes') else name
+            try:
+                responses[name], timings[name] = future.result()
+            except Exception as e:
+                st.error(f"Failed to load '{name}': {e}")
+                responses[name], timings[name] = None, None
+                failed.add(table)
+            if table in failed:
+                continue
+            if table == "metal_cups":
+                metal_cups_df = responses[table]
+                frame = None
+                if metal_cups_df is not None and not metal_cups_df.empty:
+                    frame = build_metal_cups_frame(metal_cups_df)
+                store['frames'][table] = frame
+                store['marks'][table] = high_water_mark(metal_cups_df) if frame is not None else None
+                continue
+            if table not in responses or f'{table}_sizes' not in responses:
+                continue
+
+            prod_df = responses[table]
+            sizes_df = responses[f'{table}_sizes']
+            frame = None
+            # Check if both tables have data
+            if prod_df is not None and sizes_df is not None:
+                if not prod_df.empty and not sizes_df.empty:
+                    frame = build_table_frame(prod_df, sizes_df, image_base_url(table), thumbs[table].result())
+            store['frames'][table] = frame
+            store['marks'][table] = high_water_mark(prod_df, sizes_df) if frame is not None else None
+
+    for name, elapsed in timings.items():
+        if elapsed is not None:
+            print(f"Loaded '{name}' in {elapsed:.2f}s")
+    return failed
+
+def sync_sources(store, sources):
+    # Incremental read of each source, patched into its cached frame. A table
+    # whose read fails is left as it was; the tables that failed are returned.
+    failed = set()
+    with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+        futures = {
+            executor.submit(fetch_changes, table, store['marks'][table], store['frames'].get(table)): table
+            for table in sources
+        }
+        for future in as_completed(futures):
+            table = futures[future]
+            try:
+                changes, removed, elapsed = future.result()
+            except Exception as e:
+                st.error(f"Failed to sync '{table}': {e}")
+                failed.add(table)
+                continue
+
+            thumbs = None
+            if table == "metal_cups":
+                frames = changes
+                frame = build_metal_cups_frame(changes[0]) if not changes[0].empty else None
+            else:
+                prod_df, sizes_df, thumbs = changes
+                frames = (prod_df, sizes_df)
+                frame = None
+                if not prod_df.empty:
+                    if sizes_df.empty:
+                        sizes_df = pd.DataFrame(columns=['model', 'size', 'size_code'])
+                    frame = build_table_frame(prod_df, sizes_df, image_base_url(table), thumbs)
+
+            if thumbs is not None and store['frames'].get(table) is not None:
+                current = store['frames'][table]
+                store['frames'][table] = current.assign(**{
+                    'thumbnail url': thumbnail_urls(current['code'], current['image url'], image_base_url(table), thumbs)
+                })
+
+            if frame is not None:
+                store['frames'][table] = patch_frame(store['frames'][table], frame, 'code')
+                mark = high_water_mark(*(df for df in frames if not df.empty))
+                if mark is not None:
+                    store['marks'][table] = max(store['marks'][table], mark)
+            if removed and store['frames'].get(table) is not None:
+                current = store['frames'][table]
+                current = current[~current['code'].isin(removed)].reset_index(drop=True)
+                store['frames'][table] = current if not current.empty else None
+            print(f"Synced '{table}' in {elapsed:.2f}s ({0 if frame is None else len(frame)} rows changed, "
+                  f"{len(removed)} removed)")
+    return failed
+
+def save_snapshot(store, sources):
+    # Writes each source's frame to an Arrow IPC file, with its high-water
+    # mark in the schema metadata, replacing the file whole.
+    for table in sources:
+        path = os.path.join(SNAPSHOT_DIR, f'{table}.arrow')
+        frame = store['frames'].get(table)
+        mark = store['marks'].get(table)
+        try:
+            # Tables without data are stored with no columns
+            if frame is None:
+                arrow_table = pa.table({})
+            else:
+                arrow_table = pa.Table.from_pandas(frame, preserve_index=False)
+            metadata = dict(arrow_table.schema.metadata or {})
+            metadata[b'mark'] = (mark.isoformat() if mark is not None else '').encode()
+            arrow_table = arrow_table.replace_schema_metadata(metadata)
+            with replacing(path) as sink, pa.ipc.new_file(sink, arrow_table.schema) as writer:
+                writer.write_table(arrow_table)
+        except (pa.ArrowException, OSError) as e:
+            print(f"Could not write snapshot for '{table}': {e}")
+
+def restore_snapshot(store):
+    # Loads every snapshot file through a memory map into the store and
+    # returns the tables that were restored
+    restored = []
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return restored
+    for file_name in sorted(os.listdir(SNAPSHOT_DIR)):
+        if not file_name.endswith('.arrow'):
+            continue
+        table = file_name[:-len('.arrow')]
+        try:
+            with pa.memory_map(os.path.join(SNAPSHOT_DIR, file_name)) as source:
+                arrow_table = pa.ipc.open_file(source).read_all()
+        except (pa.ArrowException, OSError) as e:
+            print(f"Could not read snapshot for '{table}': {e}")
+            continue
+        frame = arrow_table.to_pandas() if arrow_table.num_columns else None
+        # List columns come back as numpy arrays, the pages expect lists
+        for name in arrow_table.column_names:
+            if pa.types.is_list(arrow_table.schema.field(name).type):
+                frame[name] = arrow_table.column(name).to_pylist()
+        mark = (arrow_table.schema.metadata or {}).get(b'mark', b'').decode()
+        store['frames'][table] = frame
+        store['marks'][table] = pd.Timestamp(mark) if mark else None
+        restored.append(table)
+    print(f"Restored {len(restored)} tables from the catalog snapshot")
+    return restored
+
+def update_sources(store, to_load, to_sync):
+    # Returns the tables brought up to date, for the caller to snapshot.
+    # Tables that failed to read are tried again after CATALOG_TTL, and
+    # their snapshot files are left as they are rather than overwritten with
+    # whatever the store held.
+    failed = set()
+    if to_load:
+        failed |= load_sources(store, to_load)
+    if to_sync:
+        failed |= sync_sources(store, to_sync)
+    now = time.time()
+    for table in to_load + to_sync:
+        store['synced_at'][table] = now
+    return [table for table in to_load + to_sync if table not in failed]
+
+def refresh_in_background(store, sources):
+    # Brings the tables served from the snapshot up to date. The work is done
+    # on a scratch copy so the store lock is only held while swapping the
+    # results in (and writing their snapshot), and sessions keep being served
+    # from the snapshot meanwhile. A table that a foreground load_data
+    # updated in the meantime keeps what that load got.
+    with store['lock']:
+        scratch = {'frames': dict(store['frames']), 'marks': dict(store['marks']), 'synced_at': {}}
+        started = {table: store['synced_at'].get(table) for table in sources}
+    to_load = [table for table in sources if scratch['marks'].get(table) is None]
+    to_sync = [table for table in sources if table not in to_load]
+    try:
+        updated = update_sources(scratch, to_load, to_sync)
+    except Exception as e:
+        print(f"Background catalog refresh failed: {e}")
+        return
+    with store['lock']:
+        swapped = [table for table in sources if store['synced_at'].get(table) == started[table]]
+        store['combined'].clear()
+        for table in swapped:
+            store['frames'][table] = scratch['frames'].get(table)
+            store['marks'][table] = scratch['marks'].get(table)
+            store['synced_at'][table] = scratch['synced_at'].get(table, store['synced_at'].get(table, 0))
+        save_snapshot(store, [table for table in swapped if table in updated])
+    print(f"Refreshed {len(swapped)} of {len(sources)} tables from Supabase in the background")
+
+def load_data(materials_dict, sync=False, full=False):
+    # Returns the combined catalog from the process-wide store. Sources are
+    # read in full the first time (or with full=True); after that, once they
+    # are older than CATALOG_TTL or when sync=True, only rows changed since
+    # the last sync are fetched and patched in, and rows deleted since are
+    # dropped. A new process starts from the on-disk snapshot and refreshes
+    # it in the background.
+    tables = [f'{category}_{material}' for category, materials in materials_dict.items() for material in materials]
+    sources = tables + ["metal_cups"]
+    store = catalog_store()
+    load_start = time.perf_counter()
+
+    with store['lock']:
+        if not store['restored']:
+            # First call in this process: serve whatever the last snapshot
+            # holds straight away and bring it up to date in the background
+            store['restored'] = True
+            restored = restore_snapshot(store)
+            for table in restored:
+                store['synced_at'][table] = time.time()
+            if restored:
+                threading.Thread(target=refresh_in_background, args=(store, restored), daemon=True).start()
+
+        now = time.time()
+        due = [table for table in sources
+               if sync or now - store['synced_at'].get(table, 0) > CATALOG_TTL]
+        to_load = [table for table in sources
+                   if full or table not in store['frames'] or (table in due and store['marks'].get(table) is None)]
+        to_sync = [table for table in due if table not in to_load]
+
+        if to_load or to_sync:
+            save_snapshot(store, update_sources(store, to_load, to_sync))
+            store['combined'].clear()
+            print(f"Loaded catalog in {time.perf_counter() - load_start:.2f}s")
+
+        # The combined frame and its search index are built once per set of
+        # sources and shared, not copied, by every session until one of the
+        # sources changes. Pages must treat the frame as read-only.
+        key = tuple(sources)
+        if key not in store['combined']:
+            # Keep the original table order so the combined DataFrame is unchanged
+            data_frames = [store['frames'][table] for table in sources if store['frames'].get(table) is not None]
+            all_data = combine_frames(data_frames)
+            if all_data is None:
+                return pd.DataFrame()
+            store['combined'][key] = (all_data, SearchIndex(all_data))
+        all_data, search_index = store['combined'][key]
+
+    # Assign to session state
+    st.session_state['products'] = all_data
+    st.session_state['search_index'] = search_index
+    return all_data
+
+def combine_frames(data_frames):
     # Combine all DataFrames into one
     if data_frames:
         all_data = pd.concat(data_frames, ignore_index=True)
@@ -124,14 +460,18 @@ def load_data(materials_dict):
         # Ensure 'product code' exists in all entries
         if 'product_code' not in all_data.columns:
             st.error("'product_code' column is missing from the combined DataFrame.")
-            return pd.DataFrame()
+            return None
 
         # Rename 'product_code' to 'product code' for consistency
         all_data.rename(columns={'product_code': 'product code'}, inplace=True)
 
-        # Assign to session state
-        st.session_state['products'] = all_data
-        return all_data
+        # Frames from a snapshot taken before thumbnails existed fall back to
+        # the full image
+        if 'thumbnail url' not in all_data.columns:
+            all_data['thumbnail url'] = all_data['image url']
+        else:
+            all_data['thumbnail url'] = all_data['thumbnail url'].fillna(all_data['image url'])
+        return compact_frame(all_data)
     else:
         st.error("No data found in any of the product tables.")
-        return pd.DataFrame()
+        return None